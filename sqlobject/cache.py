@@ -6,9 +6,402 @@ objects in a cache that doesn't allow them to be garbage collected
 (unless caching is turned off).
 """
 
+import cPickle as pickle
+import mmap
+import os
+import struct
+import sys
 import threading
-from weakref import ref
+import zlib
+from hashlib import md5
+from thread import get_ident
+from weakref import KeyedRef
+from collections import deque
 from time import time as now
+try:
+    from collections import OrderedDict
+except ImportError: # Python 2.6
+    OrderedDict = None
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+from util.threadinglocal import local
+
+def estimateSize(obj):
+    """
+    A rough estimate of the memory held by a cached object: the object
+    itself, its attribute dictionary and the values in that
+    dictionary (not followed any deeper).
+    """
+    size = sys.getsizeof(obj)
+    d = getattr(obj, '__dict__', None)
+    if d is not None:
+        size += sys.getsizeof(d)
+        for value in d.values():
+            size += sys.getsizeof(value)
+    return size
+
+class CachePolicy(object):
+
+    """
+    An eviction policy decides which objects are moved from the strong
+    cache of a `CacheFactory` into its weakref cache.  The factory
+    calls the hooks below as objects enter, leave and are found in
+    the strong cache, and runs ``cull()`` every ``cullFrequency``
+    accesses if ``periodicCull`` is true.
+    """
+
+    periodicCull = True
+
+    def __init__(self, factory, maxEntries=None, maxBytes=None):
+        self.factory = factory
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+
+    def touch(self, id):
+        """Called on every strong cache hit."""
+        pass
+
+    def added(self, id, obj):
+        """Called after an object has been put into the strong cache."""
+        pass
+
+    def discarded(self, id):
+        """Called after an object has left the strong cache."""
+        pass
+
+    def reset(self):
+        """Called after the strong cache has been emptied."""
+        pass
+
+    def sweep(self, limit):
+        """
+        Returns the ids ``CacheFactory.cull()`` should move to the
+        weakref cache, looking at no more than ``limit`` objects.
+        Called with the factory lock held.
+        """
+        return []
+
+class CullPolicy(CachePolicy):
+
+    """
+    The traditional policy: every ``cullFrequency`` accesses
+    ``CacheFactory.cull()`` expires every ``cullFraction``-th object.
+
+    The ids wait in a queue in the order they were cached; each cull
+    takes the next ``cullBatch`` ids off the front, expires every
+    ``cullFraction``-th of them and puts the rest back at the end, so
+    a cull costs the same however large the cache is and every object
+    eventually gets its turn.  Ids that have left the cache some
+    other way are dropped from the queue when the sweep reaches them;
+    an id cached again before that keeps its place, so it is never
+    queued twice.
+    """
+
+    def __init__(self, factory, maxEntries=None, maxBytes=None):
+        CachePolicy.__init__(self, factory, maxEntries, maxBytes)
+        self.queue = deque()
+        # The ids in the queue
+        self.queued = set()
+        self.position = 0
+
+    def added(self, id, obj):
+        if id not in self.queued:
+            self.queued.add(id)
+            self.queue.append(id)
+
+    def reset(self):
+        self.queue.clear()
+        self.queued.clear()
+
+    def sweep(self, limit):
+        cache = self.factory.cache
+        queue = self.queue
+        queued = self.queued
+        fraction = self.factory.cullFraction
+        victims = []
+        for i in xrange(min(limit, len(queue))):
+            id = queue.popleft()
+            if id not in cache:
+                queued.discard(id)
+                continue
+            if self.position:
+                queue.append(id)
+            else:
+                queued.discard(id)
+                victims.append(id)
+            self.position = (self.position + 1) % fraction
+        return victims
+
+class LRUPolicy(CachePolicy):
+
+    """
+    Keeps the strong cache ordered by recency of use and moves the
+    least recently used objects to the weakref cache as soon as the
+    class goes over ``maxEntries`` objects or over ``maxBytes``
+    estimated bytes (see `estimateSize`).  Every access costs O(1);
+    there is no periodic cull.
+    """
+
+    periodicCull = False
+    sizeOf = staticmethod(estimateSize)
+
+    def __init__(self, factory, maxEntries=None, maxBytes=None):
+        assert OrderedDict is not None, (
+            "The 'lru' cache policy requires Python 2.7")
+        CachePolicy.__init__(self, factory, maxEntries, maxBytes)
+        # id -> estimated size; the least recently used id comes first
+        self.order = OrderedDict()
+        self.totalBytes = 0
+        self.lock = threading.Lock()
+
+    def touch(self, id):
+        self.lock.acquire()
+        try:
+            size = self.order.pop(id, None)
+            if size is not None:
+                self.order[id] = size
+        finally:
+            self.lock.release()
+
+    def added(self, id, obj):
+        if self.maxBytes:
+            size = self.sizeOf(obj)
+        else:
+            size = 0
+        evicted = []
+        self.lock.acquire()
+        try:
+            self.totalBytes -= self.order.pop(id, 0)
+            self.order[id] = size
+            self.totalBytes += size
+            while self.order and self._overLimit():
+                oldId, oldSize = self.order.popitem(last=False)
+                self.totalBytes -= oldSize
+                evicted.append(oldId)
+        finally:
+            self.lock.release()
+        for oldId in evicted:
+            self.factory._evict(oldId)
+
+    def _overLimit(self):
+        if self.maxEntries and len(self.order) > self.maxEntries:
+            return True
+        if self.maxBytes and self.totalBytes > self.maxBytes:
+            return True
+        return False
+
+    def discarded(self, id):
+        self.lock.acquire()
+        try:
+            self.totalBytes -= self.order.pop(id, 0)
+        finally:
+            self.lock.release()
+
+    def reset(self):
+        self.lock.acquire()
+        try:
+            self.order.clear()
+            self.totalBytes = 0
+        finally:
+            self.lock.release()
+
+cachePolicies = {
+    'cull': CullPolicy,
+    'lru': LRUPolicy,
+    }
+
+class SharedRowCache(object):
+
+    """
+    A second-level cache of database rows shared between processes
+    (e.g. the workers of one application).  It keeps the raw column
+    tuples ``SQLObject._SO_selectInit`` takes, keyed by class name
+    and id, so a process that misses in its own `CacheSet` can build
+    the object without a query.
+
+    Every key has a version that changes when the row is invalidated.
+    A loader asks for the version before it queries the database and
+    passes it back to `store`, which drops the row if the key has
+    been invalidated meanwhile -- so a row read before an UPDATE
+    can't be stored after the UPDATE invalidated it.
+    """
+
+    def lookup(self, key):
+        """
+        Returns ``(row, version)``; ``row`` is None if the key isn't
+        cached.
+        """
+        raise NotImplementedError
+
+    def store(self, key, row, version):
+        """
+        Caches ``row`` unless ``key`` has been invalidated since
+        ``lookup`` returned ``version``.
+        """
+        raise NotImplementedError
+
+    def invalidate(self, key):
+        """Forgets the row and changes the version of ``key``."""
+        raise NotImplementedError
+
+class SharedFileRowCache(SharedRowCache):
+
+    """
+    A `SharedRowCache` in a memory-mapped file, shared by every
+    process that opens the same ``path``.  The file holds ``slots``
+    slots of ``slotSize`` bytes; a key goes to the slot chosen by its
+    CRC, replacing whatever was there, and rows that don't fit in a
+    slot aren't cached.  Access is serialized with ``fcntl`` locks, so
+    this needs a Unix-like system.  The sizes of an existing file are
+    used instead of the arguments.  A forked process opens the file
+    again, since processes sharing a file descriptor share its lock.
+    """
+
+    magic = 'SOrc'
+    headerFormat = '<4sII'
+    slotFormat = '<QHI' # version, key length, row length
+
+    def __init__(self, path, slots=4096, slotSize=1024):
+        assert fcntl is not None, (
+            "The 'shm' shared cache requires fcntl (a Unix-like system)")
+        self.path = path
+        self.headerSize = struct.calcsize(self.headerFormat)
+        self.slotHeaderSize = struct.calcsize(self.slotFormat)
+        self._open(os.O_CREAT)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            header = os.read(self.fd, self.headerSize)
+            if len(header) == self.headerSize:
+                magic, slots, slotSize = struct.unpack(self.headerFormat,
+                                                       header)
+                if magic != self.magic:
+                    raise IOError("%s is not a shared cache file" % path)
+            else:
+                os.ftruncate(self.fd, self.headerSize + slots*slotSize)
+                os.lseek(self.fd, 0, 0)
+                os.write(self.fd, struct.pack(self.headerFormat, self.magic,
+                                              slots, slotSize))
+            self.slots = slots
+            self.slotSize = slotSize
+            self.map = mmap.mmap(self.fd, self.headerSize + slots*slotSize)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _open(self, flags=0):
+        # Opens the file for this process (fcntl.flock() locks belong to
+        # the open file, which a fork shares with its parent)
+        flags |= os.O_RDWR | getattr(os, 'O_NOFOLLOW', 0)
+        fd = os.open(self.path, flags, 0600)
+        if os.fstat(fd).st_uid != os.getuid():
+            os.close(fd)
+            raise IOError("The shared cache file %s belongs to another user"
+                          % self.path)
+        self.fd = fd
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    def _offset(self, key):
+        return (self.headerSize +
+                (zlib.crc32(key) & 0xffffffff) % self.slots * self.slotSize)
+
+    def _acquire(self, mode):
+        if self.pid != os.getpid():
+            # Forked: lock a file of our own (the map stays shared)
+            inherited = self.fd
+            self._open()
+            os.close(inherited)
+        self.lock.acquire()
+        try:
+            fcntl.flock(self.fd, mode)
+        except:
+            self.lock.release()
+            raise
+
+    def _release(self):
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        finally:
+            self.lock.release()
+
+    def lookup(self, key):
+        offset = self._offset(key)
+        self._acquire(fcntl.LOCK_SH)
+        try:
+            version, keyLength, rowLength = struct.unpack_from(
+                self.slotFormat, self.map, offset)
+            if not rowLength or keyLength != len(key):
+                return None, version
+            start = offset + self.slotHeaderSize
+            if self.map[start:start+keyLength] != key:
+                return None, version
+            start += keyLength
+            data = self.map[start:start+rowLength]
+        finally:
+            self._release()
+        return pickle.loads(data), version
+
+    def store(self, key, row, version):
+        try:
+            data = pickle.dumps(row, 2)
+        except (pickle.PicklingError, TypeError):
+            return
+        if self.slotHeaderSize + len(key) + len(data) > self.slotSize:
+            return
+        offset = self._offset(key)
+        self._acquire(fcntl.LOCK_EX)
+        try:
+            if struct.unpack_from(self.slotFormat, self.map,
+                                  offset)[0] != version:
+                return
+            start = offset + self.slotHeaderSize
+            self.map[start:start+len(key)] = key
+            start += len(key)
+            self.map[start:start+len(data)] = data
+            struct.pack_into(self.slotFormat, self.map, offset,
+                             version, len(key), len(data))
+        finally:
+            self._release()
+
+    def invalidate(self, key):
+        offset = self._offset(key)
+        self._acquire(fcntl.LOCK_EX)
+        try:
+            version = struct.unpack_from(self.slotFormat, self.map,
+                                         offset)[0]
+            struct.pack_into(self.slotFormat, self.map, offset,
+                             (version + 1) & 0xffffffffffffffff, 0, 0)
+        finally:
+            self._release()
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+sharedCaches = {
+    'shm': SharedFileRowCache,
+    }
+
+class _Loading(object):
+    """An object being loaded by the thread ``owner``."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.event = threading.Event()
+
+def _deadRefRemover(expiredCache):
+    """
+    Returns the callback of the weak references kept in
+    ``expiredCache``: it drops the entry of a collected object, unless
+    the entry has been replaced by a newer reference meanwhile.  It
+    runs whenever the garbage collector decides to, so it takes no
+    locks.
+    """
+    def removeDead(wr):
+        if expiredCache.get(wr.key) is wr:
+            expiredCache.pop(wr.key, None)
+    return removeDead
 
 class CacheFactory(object):
 
@@ -20,7 +413,8 @@ class CacheFactory(object):
     """
 
     def __init__(self, cullFrequency=100, cullFraction=2,
-                 cache=True):
+                 cache=True, policy='cull', maxEntries=None,
+                 maxBytes=None, cullBatch=None):
         """
         Every cullFrequency times that an item is retrieved from
         this cache, the cull method is called.
@@ -31,25 +425,50 @@ class CacheFactory(object):
         moment, but everything object will have its time to go
         eventually.  The fraction is given as an integer, and one
         in that many objects are expired (i.e., the default is 1/2
-        of objects are expired).
+        of objects are expired).  A single cull only looks at
+        ``cullBatch`` objects (by default ``cullFrequency *
+        cullFraction``), picking up where the previous cull stopped.
 
         By setting cache to False, items won't be cached.
 
         However, in all cases a weak reference is kept to created
         objects, and if the object hasn't been garbage collected
         it will be returned.
+
+        ``policy`` selects how objects leave the strong cache: a name
+        from `cachePolicies` (``'cull'``, the behaviour described
+        above, or ``'lru'``) or a `CachePolicy` subclass.  The
+        ``'lru'`` policy does not cull; instead it bounds the strong
+        cache to ``maxEntries`` objects and ``maxBytes`` estimated
+        bytes, evicting the least recently used objects first.
         """
 
         self.cullFrequency = cullFrequency
         self.cullCount = 0
-        self.cullOffset = 0
         self.cullFraction = cullFraction
+        if cullBatch is None:
+            cullBatch = cullFrequency * cullFraction
+        self.cullBatch = cullBatch
         self.doCache = cache
 
+        if isinstance(policy, basestring):
+            policy = cachePolicies[policy]
+        self.policy = policy(self, maxEntries=maxEntries, maxBytes=maxBytes)
+        self.periodicCull = self.policy.periodicCull
+
         if self.doCache:
             self.cache = {}
         self.expiredCache = {}
+        self._removeDead = _deadRefRemover(self.expiredCache)
+        # (column name, value) or (column names, values) of alternate
+        # and unique keys -> weak reference to the object
+        self.alternates = {}
+        self._removeDeadAlternate = _deadRefRemover(self.alternates)
         self.lock = threading.Lock()
+        # id -> _Loading, for the objects being loaded right now
+        self.loading = {}
+        self.local = local()
+        self.resetStats()
 
     def tryGet(self, id):
         """
@@ -65,14 +484,11 @@ class CacheFactory(object):
 
     def get(self, id):
         """
-        This method can cause deadlocks!  tryGet is safer
-
         This returns the object found in cache, or None.  If None,
-        then the cache will remain locked!  This is so that the
-        calling function can create the object in a threadsafe manner
-        before releasing the lock.  You should use this like (note
-        that ``cache`` is actually a CacheSet object in this
-        example)::
+        then the id is reserved for the calling thread, so that it can
+        create the object before anybody else does.  You should use
+        this like (note that ``cache`` is actually a CacheSet object
+        in this example)::
 
           obj = cache.get(some_id, my_class)
           if obj is None:
@@ -80,7 +496,13 @@ class CacheFactory(object):
                   obj = create_object(some_id)
                   cache.put(some_id, my_class, obj)
               finally:
-                  cache.finishPut(cls)
+                  cache.finishPut(my_class, some_id)
+
+        Other threads that ask for the same id before ``finishPut()``
+        wait for the reserving thread and then get its object, so the
+        object is loaded only once.  Threads asking for other ids are
+        not blocked.  If the reserving thread never calls
+        ``finishPut()`` those threads wait forever -- tryGet is safer.
 
         This method checks both the main cache (which retains
         references) and the 'expired' cache, which retains only weak
@@ -88,58 +510,90 @@ class CacheFactory(object):
         """
 
         if self.doCache:
-            if self.cullCount > self.cullFrequency:
-                # Two threads could hit the cull in a row, but
-                # that's not so bad.  At least by setting cullCount
-                # back to zero right away we avoid this.  The cull
-                # method has a lock, so it's threadsafe.
-                self.cullCount = 0
-                self.cull()
-            else:
-                self.cullCount = self.cullCount + 1
+            if self.periodicCull:
+                if self.cullCount > self.cullFrequency:
+                    # Two threads could hit the cull in a row, but
+                    # that's not so bad.  At least by setting cullCount
+                    # back to zero right away we avoid this.  The cull
+                    # method has a lock, so it's threadsafe.
+                    self.cullCount = 0
+                    self.cull()
+                else:
+                    self.cullCount = self.cullCount + 1
 
-            try:
-                return self.cache[id]
-            except KeyError:
-                pass
-            self.lock.acquire()
             try:
                 val = self.cache[id]
             except KeyError:
                 pass
             else:
-                self.lock.release()
+                self.hits += 1
+                self.policy.touch(id)
                 return val
-            try:
-                val = self.expiredCache[id]()
-            except KeyError:
-                return None
-            else:
-                del self.expiredCache[id]
-                if val is None:
-                    return None
-            self.cache[id] = val
-            self.lock.release()
-            return val
-
         else:
             try:
                 val = self.expiredCache[id]()
                 if val is not None:
+                    self.resurrections += 1
                     return val
             except KeyError:
                 pass
+
+        me = get_ident()
+        while True:
             self.lock.acquire()
             try:
-                val = self.expiredCache[id]()
-            except KeyError:
-                return None
-            else:
-                if val is None:
-                    del self.expiredCache[id]
+                val = self._lookup(id)
+                if val is not None:
+                    return val
+                loading = self.loading.get(id)
+                if loading is None or loading.owner == me:
+                    # Nobody is loading the object (or we are, a level
+                    # up the stack): reserve the id for this thread
+                    if loading is None:
+                        self.loading[id] = _Loading(me)
+                    self._reserved().append(id)
+                    self.misses += 1
                     return None
-            self.lock.release()
-            return val
+            finally:
+                self.lock.release()
+            # Another thread is loading the object; wait for it and
+            # look again
+            self.waits += 1
+            loading.event.wait()
+
+    def _lookup(self, id):
+        """
+        Looks for the object in both caches, moving it from the
+        expired cache back to the main cache.  Called with the lock
+        held.
+        """
+        if self.doCache:
+            val = self.cache.get(id)
+            if val is not None:
+                self.hits += 1
+                self.policy.touch(id)
+                return val
+        try:
+            val = self.expiredCache[id]()
+        except KeyError:
+            return None
+        if val is None:
+            del self.expiredCache[id]
+            return None
+        self.resurrections += 1
+        if self.doCache:
+            del self.expiredCache[id]
+            self.cache[id] = val
+            self.policy.added(id, val)
+        return val
+
+    def _reserved(self):
+        """The ids this thread has reserved with .get(), in order."""
+        try:
+            return self.local.reserved
+        except AttributeError:
+            reserved = self.local.reserved = []
+            return reserved
 
     def put(self, id, obj):
         """
@@ -148,15 +602,31 @@ class CacheFactory(object):
         """
         if self.doCache:
             self.cache[id] = obj
+            self.policy.added(id, obj)
         else:
-            self.expiredCache[id] = ref(obj)
+            self.expiredCache[id] = self._ref(id, obj)
 
-    def finishPut(self):
+    def finishPut(self, id=None):
         """
-        Releases the lock that is retained when .get() is called and
-        returns None.
+        Releases the reservation made when .get() returned None for
+        ``id`` (by default the id this thread reserved last), waking
+        up the threads waiting for that id, and returns None.
         """
-        self.lock.release()
+        reserved = self._reserved()
+        if id is None:
+            id = reserved.pop()
+        else:
+            for i in xrange(len(reserved)-1, -1, -1):
+                if reserved[i] == id:
+                    del reserved[i]
+                    break
+        self.lock.acquire()
+        try:
+            loading = self.loading.pop(id, None)
+        finally:
+            self.lock.release()
+        if loading is not None:
+            loading.event.set()
 
     def created(self, id, obj):
         """
@@ -166,52 +636,131 @@ class CacheFactory(object):
         of this situation.
         """
         if self.doCache:
-            if self.cullCount > self.cullFrequency:
-                # Two threads could hit the cull in a row, but
-                # that's not so bad.  At least by setting cullCount
-                # back to zero right away we avoid this.  The cull
-                # method has a lock, so it's threadsafe.
-                self.cullCount = 0
-                self.cull()
-            else:
-                self.cullCount = self.cullCount + 1
+            if self.periodicCull:
+                if self.cullCount > self.cullFrequency:
+                    # Two threads could hit the cull in a row, but
+                    # that's not so bad.  At least by setting cullCount
+                    # back to zero right away we avoid this.  The cull
+                    # method has a lock, so it's threadsafe.
+                    self.cullCount = 0
+                    self.cull()
+                else:
+                    self.cullCount = self.cullCount + 1
             self.cache[id] = obj
+            self.policy.added(id, obj)
         else:
-            self.expiredCache[id] = ref(obj)
+            self.expiredCache[id] = self._ref(id, obj)
+
+    def _evict(self, id):
+        """
+        Moves a single object from the strong cache to the weakref
+        cache; used by eviction policies.  Unlike `expire` the object
+        stays reachable through the cache while it is alive.
+        """
+        obj = self.cache.pop(id, None)
+        if obj is not None:
+            self.expiredCache[id] = self._ref(id, obj)
+            self.evictions += 1
+
+    def putAlternate(self, key, obj):
+        """
+        Remembers ``obj`` as the object with the alternate or unique
+        key ``key``, for as long as the object lives.
+        """
+        try:
+            self.alternates[key] = KeyedRef(obj, self._removeDeadAlternate,
+                                            key)
+        except TypeError: # unhashable value
+            pass
+
+    def getAlternate(self, key):
+        """
+        Returns the object last remembered for ``key``, or None.  The
+        object may have changed or left the cache since; the caller
+        must check.
+        """
+        try:
+            wr = self.alternates.get(key)
+        except TypeError:
+            return None
+        if wr is None:
+            return None
+        return wr()
+
+    def _ref(self, id, obj):
+        """
+        A weak reference to ``obj`` for the weakref cache; the entry
+        removes itself from the cache when ``obj`` is collected.
+        """
+        return KeyedRef(obj, self._removeDead, id)
 
     def cull(self):
-        """Runs through the cache and expires objects
+        """Expires some of the objects in the cache
 
         E.g., if ``cullFraction`` is 3, then every third object is moved to
-        the 'expired' (aka weakref) cache.
+        the 'expired' (aka weakref) cache.  Only ``cullBatch`` objects
+        are looked at; the next cull continues from there.
 
         """
         self.lock.acquire()
         try:
-            #remove dead references from the expired cache
-            keys = self.expiredCache.keys()
-            for key in keys:
-                if self.expiredCache[key]() is None:
-                    self.expiredCache.pop(key, None)
-
-            keys = self.cache.keys()
-            for i in xrange(self.cullOffset, len(keys), self.cullFraction):
-                id = keys[i]
+            self.culls += 1
+            for id in self.policy.sweep(self.cullBatch):
+                strong = self.cache.pop(id, None)
+                if strong is None:
+                    # Already gone
+                    continue
                 # create a weakref, then remove from the cache
-                obj = ref(self.cache[id])
-                del self.cache[id]
+                obj = self._ref(id, strong)
+                self.evictions += 1
 
                 #the object may have been gc'd when removed from the cache
                 #above, no need to place in expiredCache
                 if obj() is not None:
                     self.expiredCache[id] = obj
-            # This offset tries to balance out which objects we
-            # expire, so no object will just hang out in the cache
-            # forever.
-            self.cullOffset = (self.cullOffset + 1) % self.cullFraction
         finally:
             self.lock.release()
 
+    def resetStats(self):
+        """
+        Zeroes the counters reported by `stats`.  The counters are
+        plain integers updated without locking, so they are cheap
+        enough to keep, but may miss an update now and then.
+        """
+        self.hits = 0
+        self.resurrections = 0
+        self.misses = 0
+        self.waits = 0
+        self.culls = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Returns a dictionary with the counters since the last
+        `resetStats`: ``hits`` (found in the main cache),
+        ``resurrections`` (found through a weak reference), ``misses``
+        (the caller had to load the object), ``waits`` (waited for
+        another thread loading the same object), ``culls`` (cull
+        runs), ``evictions`` (objects moved from the main cache to the
+        weakref cache by culls or by the policy); plus the current
+        ``size`` of the main cache and ``weakSize`` of the weakref
+        cache.
+        """
+        if self.doCache:
+            size = len(self.cache)
+        else:
+            size = 0
+        return {
+            'hits': self.hits,
+            'resurrections': self.resurrections,
+            'misses': self.misses,
+            'waits': self.waits,
+            'culls': self.culls,
+            'evictions': self.evictions,
+            'size': size,
+            'weakSize': len(self.expiredCache),
+            }
+
     def clear(self):
         """
         Removes everything from the cache.  Warning!  This can cause
@@ -219,7 +768,9 @@ class CacheFactory(object):
         """
         if self.doCache:
             self.cache.clear()
+            self.policy.reset()
         self.expiredCache.clear()
+        self.alternates.clear()
 
     def expire(self, id):
         """
@@ -232,6 +783,7 @@ class CacheFactory(object):
         try:
             if id in self.cache:
                 del self.cache[id]
+                self.policy.discarded(id)
             if id in self.expiredCache:
                 del self.expiredCache[id]
         finally:
@@ -247,8 +799,9 @@ class CacheFactory(object):
         self.lock.acquire()
         try:
             for key, value in self.cache.items():
-                self.expiredCache[key] = ref(value)
+                self.expiredCache[key] = self._ref(key, value)
             self.cache = {}
+            self.policy.reset()
         finally:
             self.lock.release()
 
@@ -290,28 +843,42 @@ class CacheSet(object):
 
     def __init__(self, *args, **kw):
         self.caches = {}
+        # the SharedRowCache behind the per-class caches, if any
+        self.shared = kw.pop('shared', None)
+        # The negative cache remembers for negativeTTL seconds which
+        # ids and alternate keys were not found; class name ->
+        # {id or (column, value): expiry time}
+        self.negativeTTL = kw.pop('negativeTTL', None)
+        self.negativeMaxEntries = kw.pop('negativeMaxEntries', 1000)
+        self.missing = {}
+        # class name -> class, for the keys of the shared cache
+        self.classes = {}
         self.args = args
         self.kw = kw
 
+    def _newCache(self, cls):
+        self.classes[cls.__name__] = cls
+        cache = self.caches[cls.__name__] = CacheFactory(*self.args,
+                                                         **self.kw)
+        return cache
+
     def get(self, id, cls):
         try:
             return self.caches[cls.__name__].get(id)
         except KeyError:
-            self.caches[cls.__name__] = CacheFactory(*self.args, **self.kw)
-            return self.caches[cls.__name__].get(id)
+            return self._newCache(cls).get(id)
 
     def put(self, id, cls, obj):
         self.caches[cls.__name__].put(id, obj)
 
-    def finishPut(self, cls):
-        self.caches[cls.__name__].finishPut()
+    def finishPut(self, cls, id=None):
+        self.caches[cls.__name__].finishPut(id)
 
     def created(self, id, cls, obj):
         try:
             self.caches[cls.__name__].created(id, obj)
         except KeyError:
-            self.caches[cls.__name__] = CacheFactory(*self.args, **self.kw)
-            self.caches[cls.__name__].created(id, obj)
+            self._newCache(cls).created(id, obj)
 
     def expire(self, id, cls):
         try:
@@ -319,6 +886,100 @@ class CacheSet(object):
         except KeyError:
             pass
 
+    def putAlternate(self, key, cls, obj):
+        try:
+            self.caches[cls.__name__].putAlternate(key, obj)
+        except KeyError:
+            self._newCache(cls).putAlternate(key, obj)
+
+    def getAlternate(self, key, cls):
+        try:
+            return self.caches[cls.__name__].getAlternate(key)
+        except KeyError:
+            return None
+
+    def isMissing(self, key, cls):
+        """
+        Tells if ``key`` (an id or a ``(column, value)`` pair) was not
+        found in the database less than ``negativeTTL`` seconds ago.
+        """
+        if not self.negativeTTL:
+            return False
+        try:
+            missing = self.missing[cls.__name__]
+            expires = missing[key]
+        except (KeyError, TypeError): # TypeError: unhashable value
+            return False
+        if expires > now():
+            return True
+        missing.pop(key, None)
+        return False
+
+    def addMissing(self, key, cls):
+        """Records that ``key`` was not found in the database."""
+        if not self.negativeTTL:
+            return
+        missing = self.missing.setdefault(cls.__name__, {})
+        if len(missing) >= self.negativeMaxEntries:
+            current = now()
+            for oldKey, expires in missing.items():
+                if expires <= current:
+                    missing.pop(oldKey, None)
+            while len(missing) >= self.negativeMaxEntries:
+                try:
+                    missing.popitem()
+                except KeyError:
+                    break
+        try:
+            missing[key] = now() + self.negativeTTL
+        except TypeError:
+            pass
+
+    def removeMissing(self, key, cls):
+        try:
+            self.missing[cls.__name__].pop(key, None)
+        except (KeyError, TypeError):
+            pass
+
+    def clearMissing(self, cls=None):
+        if cls is None:
+            self.missing.clear()
+        else:
+            self.clearMissingByName(cls.__name__)
+
+    def clearMissingByName(self, clsname):
+        self.missing.pop(clsname, None)
+
+    def _sharedKey(self, id, cls):
+        # The table and a digest of the class and its columns, so that
+        # a row is never read by a class with another layout
+        if isinstance(id, unicode):
+            id = id.encode('utf-8')
+        sqlmeta = cls.sqlmeta
+        layout = [sqlmeta.registry or '', cls.__module__, cls.__name__,
+                  sqlmeta.idName]
+        layout.extend([column.dbName for column in sqlmeta.columnList])
+        digest = md5('\0'.join(layout)).hexdigest()[:12]
+        return '%s:%s:%s' % (sqlmeta.table, digest, id)
+
+    def lookupRow(self, id, cls):
+        """
+        Returns ``(row, version)`` from the shared cache (see
+        `SharedRowCache.lookup`), or ``(None, None)`` if there is no
+        shared cache.
+        """
+        if self.shared is None:
+            return None, None
+        return self.shared.lookup(self._sharedKey(id, cls))
+
+    def storeRow(self, id, cls, row, version):
+        if self.shared is not None:
+            self.shared.store(self._sharedKey(id, cls), row, version)
+
+    def invalidateRow(self, id, cls):
+        if self.shared is not None:
+            self.shared.invalidate(self._sharedKey(id, cls))
+
     def clear(self, cls=None):
         if cls is None:
             for cache in self.caches.values():
@@ -337,13 +998,34 @@ class CacheSet(object):
 
     def allIDs(self, cls):
         try:
-            self.caches[cls.__name__].allIDs()
+            return self.caches[cls.__name__].allIDs()
         except KeyError:
             return []
 
     def allSubCaches(self):
         return self.caches.values()
 
+    def stats(self, cls=None):
+        """
+        Returns the statistics (see `CacheFactory.stats`) of the cache
+        for the given class, or a dictionary of them for all classes,
+        keyed by class name.
+        """
+        if cls is not None:
+            try:
+                return self.caches[cls.__name__].stats()
+            except KeyError:
+                return None
+        return dict([(name, cache.stats())
+                     for name, cache in self.caches.items()])
+
+    def resetStats(self, cls=None):
+        if cls is None:
+            for cache in self.caches.values():
+                cache.resetStats()
+        elif cls.__name__ in self.caches:
+            self.caches[cls.__name__].resetStats()
+
     def allSubCachesByClassNames(self):
         return self.caches
 
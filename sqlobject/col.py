@@ -571,6 +571,8 @@ class NQuoted(sqlbuilder.SQLExpression):
         return hash(self.value)
     def __sqlrepr__(self, db):
         assert db == 'mssql'
+        if sqlbuilder.isBinding():
+            return sqlbuilder.sqlrepr(self.value, db)
         return "N" + sqlbuilder.sqlrepr(self.value, db)
 
 class UnicodeStringValidator(SOValidator):
@@ -1,7 +1,9 @@
 from array import array
 import datetime
 from decimal import Decimal
+import re
 import sys
+import threading
 import time
 from types import ClassType, InstanceType, NoneType
 
@@ -180,15 +182,133 @@ def sqlrepr(obj, db=None):
     try:
         reprFunc = obj.__sqlrepr__
     except AttributeError:
+        params = getattr(_binding, 'params', None)
+        if params is not None and (type(obj) in bindableTypes or
+                _binding.collectAll and type(obj) not in _uncollectedTypes):
+            return _paramMarker % _bindValue(params, obj)
         converter = lookupConverter(obj)
         if converter is None:
             raise ValueError, "Unknown SQL builtin type: %s for %s" % \
                   (type(obj), repr(obj))
         return converter(obj, db)
     else:
+        if getattr(_binding, 'params', None) is None:
+            # Bound values are numbered, so only plain SQL is memoised
+            fragment = getattr(obj, '_sqlFragment', None)
+            if fragment is not None:
+                return fragment(reprFunc, db)
         return reprFunc(db)
 
 
+########################################
+## Bound parameters
+########################################
+
+# Values of these types are passed to the driver as query parameters
+# while binding; anything else is still rendered as a literal.
+bindableTypes = set([str, unicode, int, long, float])
+
+# Left to collectValues()' caller: sequences are rendered item by item,
+# and the expressions that render a NULL change the SQL around it
+_uncollectedTypes = set([tuple, list, dict, set, frozenset, NoneType])
+
+_binding = threading.local()
+_paramMarker = '\0P%i\0'
+_paramMarkerRE = re.compile('\0P(\\d+)\0')
+
+def _bindValue(params, obj):
+    # The same value must always get the same marker: expressions are
+    # rendered more than once and compared as SQL (to find the tables
+    # used, for example).  params keeps obj alive, so its id is stable.
+    index = _binding.index
+    key = id(obj)
+    if key not in index:
+        index[key] = len(params)
+        params.append(obj)
+    return index[key]
+
+def isBinding():
+    """
+    True while sqlrepr() is collecting values for bindParameters().
+    """
+    return getattr(_binding, 'params', None) is not None
+
+def literal_sqlrepr(obj, db=None):
+    """
+    sqlrepr() that quotes every value even while binding.
+    """
+    saved = getattr(_binding, 'params', None)
+    _binding.params = None
+    try:
+        return sqlrepr(obj, db)
+    finally:
+        _binding.params = saved
+
+def bindParameters(paramstyle, build, *args):
+    """
+    Call build(*args), which renders SQL with sqlrepr(), collecting
+    string and number values instead of quoting them.  Returns
+    ``(sql, params)`` with placeholders in the DB-API `paramstyle`;
+    params is None if no value was collected.
+    """
+    sql, params = _collect(False, build, args)
+    if not params:
+        return sql, None
+    order = []
+    def placeholder(match):
+        order.append(params[int(match.group(1))])
+        return paramPlaceholder(paramstyle, len(order))
+    if paramstyle in ('format', 'pyformat'):
+        sql = sql.replace('%', '%%')
+    sql = _paramMarkerRE.sub(placeholder, sql)
+    return sql, paramValues(paramstyle, order)
+
+def _collect(collectAll, build, args):
+    saved = (getattr(_binding, 'params', None),
+             getattr(_binding, 'index', None),
+             getattr(_binding, 'collectAll', False))
+    _binding.params = params = []
+    _binding.index = {}
+    _binding.collectAll = collectAll
+    try:
+        sql = build(*args)
+    finally:
+        _binding.params, _binding.index, _binding.collectAll = saved
+    return sql, params
+
+def collectValues(build, *args):
+    """
+    Call build(*args) like bindParameters(), but collect every value
+    sqlrepr() renders with a converter, not only the bindable ones.
+    Returns ``((texts, indexes), values)``: the texts of the SQL around
+    the values, and the index in values of each value between them.
+    """
+    sql, values = _collect(True, build, args)
+    parts = _paramMarkerRE.split(sql)
+    return (parts[0::2], [int(index) for index in parts[1::2]]), values
+
+def paramPlaceholder(paramstyle, position):
+    """
+    The placeholder for the parameter at (1-based) `position`.
+    """
+    if paramstyle == 'qmark':
+        return '?'
+    elif paramstyle == 'numeric':
+        return ':%i' % position
+    elif paramstyle == 'named':
+        return ':p%i' % position
+    else:
+        return '%s'
+
+def paramValues(paramstyle, values):
+    """
+    The parameters to pass to cursor.execute() for `values` in order.
+    """
+    if paramstyle == 'named':
+        return dict([('p%i' % (i+1), value)
+                     for i, value in enumerate(values)])
+    return values
+
 def quote_str(s, db):
     if db in ('postgres', 'rdbhost') and ('\\' in s):
         return "E'%s'" % s
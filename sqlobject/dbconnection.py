@@ -1,19 +1,25 @@
 import atexit
 from cgi import parse_qsl
+from collections import deque
+from hashlib import md5
 import inspect
 import new
 import os
 import sys
+import tempfile
 import threading
+import time
 import types
 import urllib
 import warnings
 import weakref
 
-from cache import CacheSet
+from cache import CacheSet, sharedCaches
 import classregistry
 import col
-from converters import sqlrepr
+from converters import sqlrepr, bindParameters, bindableTypes, \
+     collectValues, paramPlaceholder, paramValues
+from dberrors import PoolTimeoutError
 import main
 import sqlbuilder
 from util.threadinglocal import local as threading_local
@@ -71,14 +77,35 @@ class DBConnection:
     def __init__(self, name=None, debug=False, debugOutput=False,
                  cache=True, style=None, autoCommit=True,
                  debugThreading=False, registry=None,
-                 logger=None, loglevel=None):
+                 logger=None, loglevel=None, cachePolicy='cull',
+                 cacheMaxEntries=None, cacheMaxBytes=None, cacheTTL=None,
+                 sharedCache=None, sharedCachePath=None,
+                 sharedCacheSize=4096, cacheNegativeTTL=None,
+                 cacheNegativeMaxEntries=None):
         self.name = name
         self.debug = Boolean(debug)
         self.debugOutput = Boolean(debugOutput)
         self.debugThreading = Boolean(debugThreading)
         self.debugWriter = makeDebugWriter(self, logger, loglevel)
         self.doCache = Boolean(cache)
-        self.cache = CacheSet(cache=self.doCache)
+        self._cacheOptions = dict(cache=self.doCache, policy=cachePolicy)
+        if cacheMaxEntries:
+            self._cacheOptions['maxEntries'] = int(cacheMaxEntries)
+        if cacheMaxBytes:
+            self._cacheOptions['maxBytes'] = int(cacheMaxBytes)
+        if cacheNegativeTTL:
+            self._cacheOptions['negativeTTL'] = float(cacheNegativeTTL)
+        if cacheNegativeMaxEntries:
+            self._cacheOptions['negativeMaxEntries'] = \
+                int(cacheNegativeMaxEntries)
+        self.cache = CacheSet(**self._cacheOptions)
+        if sharedCache:
+            self.cache.shared = self._makeSharedCache(
+                sharedCache, sharedCachePath, int(sharedCacheSize))
+        if cacheTTL:
+            self.cacheTTL = float(cacheTTL)
+        else:
+            self.cacheTTL = None
         self.style = style
         self._connectionNumbers = {}
         self._connectionCount = 1
@@ -88,6 +115,12 @@ class DBConnection:
         registerConnectionInstance(self)
         atexit.register(_closeConnection, weakref.ref(self))
 
+    def _makeSharedCache(self, kind, path, size):
+        if path is None:
+            path = os.path.join(tempfile.gettempdir(), 'sqlobject-%s.%s' % (
+                md5(self.uri()).hexdigest()[:16], kind))
+        return sharedCaches[kind](path, size)
+
     def oldUri(self):
         auth = getattr(self, 'user', '') or ''
         if auth:
@@ -304,6 +337,55 @@ class ConnMethodWrapper(object):
         return '<Wrapped %r with connection %r>' % (
             self._method, self._connection)
 
+# Marks where a value goes in the SQL of a StatementTemplate
+valueSlot = '\0'
+
+class StatementTemplate(object):
+
+    """
+    The SQL of a statement with a `valueSlot` for each value, split
+    once so that render() only has to fill in the values.
+    """
+
+    def __init__(self, sql):
+        self.texts = sql.split(valueSlot)
+        # For the format and pyformat paramstyles
+        self.escapedTexts = [text.replace('%', '%%') for text in self.texts]
+
+    def render(self, dbconn, values):
+        """
+        Returns ``(sql, params)`` for `values`, in the order of the slots.
+        """
+        assert len(values) == len(self.texts) - 1
+        bound = None
+        if dbconn.bindParameters:
+            bound = [type(value) in bindableTypes for value in values]
+        if not bound or True not in bound:
+            sql = [self.texts[0]]
+            for value, text in zip(values, self.texts[1:]):
+                sql.append(dbconn.sqlrepr(value))
+                sql.append(text)
+            return ''.join(sql), None
+        paramstyle = dbconn.paramstyle
+        escape = paramstyle in ('format', 'pyformat')
+        if escape:
+            texts = self.escapedTexts
+        else:
+            texts = self.texts
+        sql = [texts[0]]
+        params = []
+        for value, isBound, text in zip(values, bound, texts[1:]):
+            if isBound:
+                params.append(value)
+                sql.append(paramPlaceholder(paramstyle, len(params)))
+            else:
+                literal = dbconn.sqlrepr(value)
+                if escape:
+                    literal = literal.replace('%', '%%')
+                sql.append(literal)
+            sql.append(text)
+        return ''.join(sql), paramValues(paramstyle, params)
+
 class DBAPI(DBConnection):
 
     """
@@ -314,12 +396,52 @@ class DBAPI(DBConnection):
     """
 
     dbName = None
+    # The cheap query poolPrePing uses to test a connection
+    pingQuery = 'SELECT 1'
+    # Whether INSERT accepts several rows in its VALUES
+    multiRowInsert = True
 
     def __init__(self, **kw):
-        self._pool = []
+        # Idle connections; the most recently released one is the last
+        self._pool = deque()
         self._poolLock = threading.Lock()
+        # Notified when a connection goes back to the pool or is closed
+        self._poolCondition = threading.Condition(self._poolLock)
+        # id(conn) -> time the pooled connection was released
+        self._poolReleased = {}
+        # id(conn) -> time the connection was opened
+        self._poolCreated = {}
+        # id(conn) -> time the connection was handed out
+        self._checkedOut = {}
+        # The number of open connections, pooled or in use
+        self._poolSize = 0
+        self.resetPoolStats()
+        self.poolMinSize = int(kw.pop('poolMinSize', 0))
+        self.poolMaxSize = int(kw.pop('poolMaxSize', 0)) or None
+        self.poolTimeout = float(kw.pop('poolTimeout', 30))
+        poolMaxIdle = kw.pop('poolMaxIdle', None)
+        if poolMaxIdle:
+            self.poolMaxIdle = float(poolMaxIdle)
+        else:
+            self.poolMaxIdle = None
+        poolRecycle = kw.pop('poolRecycle', None)
+        if poolRecycle:
+            self.poolRecycle = float(poolRecycle)
+        else:
+            self.poolRecycle = None
+        self.poolPrePing = Boolean(kw.pop('poolPrePing', False))
+        self.poolPrePingIdle = float(kw.pop('poolPrePingIdle', 10))
+        self.bindParameters = Boolean(kw.pop('bindParameters', False))
+        # The rows Iteration fetches at a time
+        self.batchSize = int(kw.pop('batchSize', 100))
+        # (statement, class or table, ...) -> StatementTemplate
+        self._statementCache = {}
+        # The shapes of sqlbuilder expressions _compiledSQL() keeps
+        self.compiledCacheSize = int(kw.pop('compiledCacheSize', 500))
+        self._compiledCache = {}
         DBConnection.__init__(self, **kw)
         self._binaryType = type(self.module.Binary(''))
+        self.paramstyle = getattr(self.module, 'paramstyle', 'format')
 
     def _runWithConnection(self, meth, *args):
         conn = self.getConnection()
@@ -330,34 +452,187 @@ class DBAPI(DBConnection):
         return val
 
     def getConnection(self):
+        waited = 0
+        while True:
+            self._poolLock.acquire()
+            try:
+                closing = self._trimPool()
+                deadline = None
+                # With poolMaxSize connections open wait for one of them
+                # to be released (or closed, if there is no pool)
+                while not self._pool and self.poolMaxSize \
+                        and self._poolSize >= self.poolMaxSize:
+                    now = time.time()
+                    if deadline is None:
+                        started = now
+                        deadline = now + self.poolTimeout
+                    elif now >= deadline:
+                        self._poolStats['timeouts'] += 1
+                        self._poolStats['waitTime'] += now - started
+                        raise PoolTimeoutError(
+                            "No database connection became available in "
+                            "%s seconds; all %i connections (poolMaxSize) "
+                            "are in use" % (self.poolTimeout,
+                                            self.poolMaxSize))
+                    self._poolCondition.wait(deadline - now)
+                now = time.time()
+                if deadline is not None:
+                    waited += 1
+                    self._poolStats['waitTime'] += now - started
+                if not self._pool:
+                    conn = self.makeConnection()
+                    self._poolSize += 1
+                    self._poolStats['created'] += 1
+                    if self._poolSize > self._poolStats['peakSize']:
+                        self._poolStats['peakSize'] = self._poolSize
+                    self._poolCreated[id(conn)] = now
+                    self._connectionNumbers[id(conn)] = self._connectionCount
+                    self._connectionCount += 1
+                    idle = None
+                else:
+                    conn = self._pool.pop()
+                    idle = now - self._poolReleased.pop(id(conn))
+                self._checkedOut[id(conn)] = now
+                self._debugPool(conn, 'ACQUIRE')
+            finally:
+                self._poolLock.release()
+            self._closeConnections(closing)
+            # A new connection is used as is; a pooled one may have
+            # grown too old or died while idle
+            if idle is None:
+                break
+            if self._isExpired(conn):
+                self._discardConnection(conn, 'recycle')
+            elif self.poolPrePing and idle > self.poolPrePingIdle \
+                    and not self._pingConnection(conn):
+                self._discardConnection(conn, 'dead')
+            else:
+                break
         self._poolLock.acquire()
         try:
-            if not self._pool:
-                conn = self.makeConnection()
-                self._connectionNumbers[id(conn)] = self._connectionCount
-                self._connectionCount += 1
-            else:
-                conn = self._pool.pop()
-            if self.debug:
-                s = 'ACQUIRE'
-                if self._pool is not None:
-                    s += ' pool=[%s]' % ', '.join([str(self._connectionNumbers[id(v)]) for v in self._pool])
-                self.printDebug(conn, s, 'Pool')
-            return conn
+            self._poolStats['checkouts'] += 1
+            if waited:
+                self._poolStats['waits'] += 1
         finally:
             self._poolLock.release()
+        return conn
+
+    def _isExpired(self, conn):
+        """Tells if ``conn`` has been open for ``poolRecycle`` seconds."""
+        if not self.poolRecycle:
+            return False
+        return time.time() - self._poolCreated.get(id(conn), 0) \
+            > self.poolRecycle
+
+    def _pingConnection(self, conn):
+        """Tells if ``conn`` still works by running `pingQuery`."""
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.pingQuery)
+            cursor.fetchall()
+            cursor.close()
+            if self.supportTransactions and \
+                    not getattr(conn, 'autocommit', False):
+                # Don't hand out the transaction the query opened
+                conn.rollback()
+        except self.module.Error:
+            return False
+        return True
+
+    def _discardConnection(self, conn, reason):
+        """Closes a connection taken out of the pool."""
+        self._poolLock.acquire()
+        try:
+            self._checkedOut.pop(id(conn), None)
+            self._poolClosed(1)
+            self._poolCondition.notify()
+        finally:
+            self._poolLock.release()
+        self._closeConnections([conn], reason)
+
+    def _poolClosed(self, count):
+        # Must be called with the pool lock held
+        self._poolSize -= count
+        self._poolStats['closed'] += count
+
+    def _trimPool(self):
+        """
+        Takes out of the pool the connections that have not been used
+        for ``poolMaxIdle`` seconds, as long as more than
+        ``poolMinSize`` connections stay open, and returns them to be
+        closed.  Must be called with the pool lock held.
+        """
+        closing = []
+        if not (self._pool and self.poolMaxIdle):
+            return closing
+        oldest = time.time() - self.poolMaxIdle
+        # The pool is used as a stack, so the connections idle for
+        # the longest time are at the bottom
+        while self._pool \
+                and self._poolSize - len(closing) > self.poolMinSize \
+                and self._poolReleased[id(self._pool[0])] < oldest:
+            conn = self._pool.popleft()
+            del self._poolReleased[id(conn)]
+            closing.append(conn)
+        if closing:
+            self._poolClosed(len(closing))
+            self._poolCondition.notifyAll()
+        return closing
+
+    def _closeConnections(self, conns, reason='idle'):
+        for conn in conns:
+            self._poolCreated.pop(id(conn), None)
+            self._debugPool(conn, 'CLOSE (%s)' % reason)
+            try:
+                conn.close()
+            except self.module.Error:
+                pass
 
     def releaseConnection(self, conn, explicit=False):
-        if self.debug:
+        if id(conn) in self._poolReleased:
+            # @@: We can get duplicate releasing of connections with
+            # the __del__ in Iteration (unfortunately, not sure why
+            # it happens)
+            return
+        self._finishConnection(conn, explicit)
+        closing = []
+        reason = 'idle'
+        self._poolLock.acquire()
+        try:
+            checkedOut = self._checkedOut.pop(id(conn), None) is not None
+            if self._pool is None:
+                if checkedOut:
+                    self._poolClosed(1)
+            elif self._isExpired(conn):
+                self._poolClosed(1)
+                closing = [conn]
+                reason = 'recycle'
+            elif id(conn) not in self._poolReleased:
+                self._pool.append(conn)
+                self._poolReleased[id(conn)] = time.time()
+                closing = self._trimPool()
+            self._poolCondition.notify()
+        finally:
+            self._poolLock.release()
+        if self._pool is None:
+            self._poolCreated.pop(id(conn), None)
+            conn.close()
+        self._closeConnections(closing, reason)
+
+    def _finishConnection(self, conn, explicit=False):
+        """
+        Ends the work done with ``conn`` before it is released:
+        commits or rolls back according to ``autoCommit`` unless the
+        release is ``explicit`` (the end of a transaction).
+        """
+        if self.debug == 'Pool':
             if explicit:
                 s = 'RELEASE (explicit)'
             else:
                 s = 'RELEASE (implicit, autocommit=%s)' % self.autoCommit
             if self._pool is None:
                 s += ' no pooling'
-            else:
-                s += ' pool=[%s]' % ', '.join([str(self._connectionNumbers[id(v)]) for v in self._pool])
-            self.printDebug(conn, s, 'Pool')
+            self._debugPool(conn, s)
         if self.supportTransactions and not explicit:
             if self.autoCommit == 'exception':
                 if self.debug:
@@ -373,14 +648,47 @@ class DBAPI(DBConnection):
                 if self.debug:
                     self.printDebug(conn, 'auto', 'ROLLBACK')
                 conn.rollback()
-        if self._pool is not None:
-            if conn not in self._pool:
-                # @@: We can get duplicate releasing of connections with
-                # the __del__ in Iteration (unfortunately, not sure why
-                # it happens)
-                self._pool.insert(0, conn)
-        else:
-            conn.close()
+
+    def _debugPool(self, conn, s):
+        # Pool messages are only printed with debug='Pool'
+        if self.debug == 'Pool':
+            if self._pool is not None:
+                s += ' idle=%i' % len(self._pool)
+            self.printDebug(conn, '%s inUse=%i' % (s, len(self._checkedOut)),
+                            'Pool')
+
+    def poolStats(self):
+        """
+        Returns a dictionary describing the connection pool: the
+        counters since the last `resetPoolStats` -- ``checkouts``
+        (connections handed out), ``waits`` (of them, how many had to
+        wait for a free connection), ``waitTime`` (seconds spent
+        waiting, in total), ``timeouts`` (waits that ended in
+        ``PoolTimeoutError``), ``created`` and ``closed`` (connections
+        opened and closed), ``peakSize`` (the most connections open at
+        once) -- and the current ``size`` (open connections),
+        ``idle`` (in the pool) and ``inUse`` (handed out).
+        """
+        self._poolLock.acquire()
+        try:
+            stats = self._poolStats.copy()
+            stats['size'] = self._poolSize
+            stats['idle'] = len(self._pool or ())
+            stats['inUse'] = len(self._checkedOut)
+        finally:
+            self._poolLock.release()
+        return stats
+
+    def resetPoolStats(self):
+        self._poolStats = {
+            'checkouts': 0,
+            'waits': 0,
+            'waitTime': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'peakSize': self._poolSize,
+            }
 
     def printDebug(self, conn, s, name, type='query'):
         if name == 'Pool' and self.debug != 'Pool':
@@ -400,33 +708,132 @@ class DBAPI(DBConnection):
         msg = '%(n)2i%(threadName)s/%(name)s%(spaces)s%(sep)s %(s)s' % locals()
         self.debugWriter.write(msg)
 
-    def _executeRetry(self, conn, cursor, query):
+    def _bindSQL(self, build, *args):
+        """
+        Returns ``(sql, params)`` for the SQL that build(*args) renders.
+        With bindParameters string and number values are passed as
+        query parameters in the driver's paramstyle; otherwise params
+        is None and every value is quoted into the SQL.
+        """
+        if not self.bindParameters:
+            return build(*args), None
+        return bindParameters(self.paramstyle, build, *args)
+
+    def _statement(self, key, build, *args):
+        """
+        The StatementTemplate for `key`, the shape of a statement; the
+        SQL is built by build(*args) the first time the shape is used.
+        """
+        try:
+            return self._statementCache[key]
+        except KeyError:
+            statement = StatementTemplate(build(*args))
+            self._statementCache[key] = statement
+            return statement
+
+    def _compiledSQL(self, parts, build, *args):
+        """
+        Returns ``(sql, params)`` for the sqlbuilder expression that
+        build(*args) returns, like ``_bindSQL(self.sqlrepr, build(*args))``;
+        the expression must only depend on `parts`.  The SQL of each
+        shape of `parts` (see sqlbuilder.compileShape()) is rendered
+        once into a StatementTemplate; the parts of the same shape only
+        fill in their values, without building the expression.  Values
+        that end up in the SQL text rather than in a slot (a LIMIT, a
+        name) are part of the key.
+        """
+        values = []
+        try:
+            shape = sqlbuilder.compileShape(parts, values)
+        except TypeError:
+            return self._bindSQL(self.sqlrepr, build(*args))
+        # The same object in several places can't tell its slots apart
+        first = {}
+        pattern = tuple([first.setdefault(id(value), index)
+                         for index, value in enumerate(values)])
+        cache = self._compiledCache
+        key = (shape, pattern)
+        entry = cache.get(key, sqlbuilder.NoDefault)
+        if entry is sqlbuilder.NoDefault:
+            baked = compiled = None
+        elif entry is None:
+            # Not compilable
+            return self._bindSQL(self.sqlrepr, build(*args))
+        else:
+            baked, compiled = entry
+            try:
+                statement, sources = compiled[
+                    tuple([values[index] for index in baked])]
+            except (KeyError, TypeError):
+                pass
+            else:
+                return statement.render(self,
+                                        [values[index] for index in sources])
+        expr = build(*args)
+        sql, params = self._bindSQL(self.sqlrepr, expr)
+        if len(cache) >= self.compiledCacheSize:
+            cache.clear()
+        (texts, indexes), rendered = collectValues(self.sqlrepr, expr)
+        sources = [first.get(id(rendered[index])) for index in indexes]
+        if None in sources:
+            # A value made while rendering
+            cache[key] = None
+            return sql, params
+        used = set(sources)
+        shared = set([first for index, first in enumerate(pattern)
+                      if first != index])
+        bakedNow = tuple([index for index in range(len(values))
+                          if index not in used or index in shared])
+        statement = StatementTemplate(valueSlot.join(texts))
+        try:
+            bakedValues = tuple([values[index] for index in bakedNow])
+            hash(bakedValues)
+        except TypeError:
+            bakedValues = None
+        if bakedValues is None or (baked is not None and bakedNow != baked) \
+                or statement.render(self, [values[index] for index in sources]) \
+                != (sql, params):
+            cache[key] = None
+            return sql, params
+        if compiled is None:
+            compiled = {}
+            cache[key] = (bakedNow, compiled)
+        elif len(compiled) >= self.compiledCacheSize:
+            compiled.clear()
+        compiled[bakedValues] = (statement, sources)
+        return sql, params
+
+    def _executeRetry(self, conn, cursor, query, params=None):
         if self.debug:
             self.printDebug(conn, query, 'QueryR')
-        return cursor.execute(query)
+            if params is not None:
+                self.printDebug(conn, params, 'QueryR', 'params')
+        if params is None:
+            return cursor.execute(query)
+        return cursor.execute(query, params)
 
-    def _query(self, conn, s):
+    def _query(self, conn, s, params=None):
         if self.debug:
             self.printDebug(conn, s, 'Query')
-        self._executeRetry(conn, conn.cursor(), s)
+        self._executeRetry(conn, conn.cursor(), s, params)
 
-    def query(self, s):
-        return self._runWithConnection(self._query, s)
+    def query(self, s, params=None):
+        return self._runWithConnection(self._query, s, params)
 
-    def _queryAll(self, conn, s):
+    def _queryAll(self, conn, s, params=None):
         if self.debug:
             self.printDebug(conn, s, 'QueryAll')
         c = conn.cursor()
-        self._executeRetry(conn, c, s)
+        self._executeRetry(conn, c, s, params)
         value = c.fetchall()
         if self.debugOutput:
             self.printDebug(conn, value, 'QueryAll', 'result')
         return value
 
-    def queryAll(self, s):
-        return self._runWithConnection(self._queryAll, s)
+    def queryAll(self, s, params=None):
+        return self._runWithConnection(self._queryAll, s, params)
 
-    def _queryAllDescription(self, conn, s):
+    def _queryAllDescription(self, conn, s, params=None):
         """
         Like queryAll, but returns (description, rows), where the
         description is cursor.description (which gives row types)
@@ -434,27 +841,27 @@ class DBAPI(DBConnection):
         if self.debug:
             self.printDebug(conn, s, 'QueryAllDesc')
         c = conn.cursor()
-        self._executeRetry(conn, c, s)
+        self._executeRetry(conn, c, s, params)
         value = c.fetchall()
         if self.debugOutput:
             self.printDebug(conn, value, 'QueryAll', 'result')
         return c.description, value
 
-    def queryAllDescription(self, s):
-        return self._runWithConnection(self._queryAllDescription, s)
+    def queryAllDescription(self, s, params=None):
+        return self._runWithConnection(self._queryAllDescription, s, params)
 
-    def _queryOne(self, conn, s):
+    def _queryOne(self, conn, s, params=None):
         if self.debug:
             self.printDebug(conn, s, 'QueryOne')
         c = conn.cursor()
-        self._executeRetry(conn, c, s)
+        self._executeRetry(conn, c, s, params)
         value = c.fetchone()
         if self.debugOutput:
             self.printDebug(conn, value, 'QueryOne', 'result')
         return value
 
-    def queryOne(self, s):
-        return self._runWithConnection(self._queryOne, s)
+    def queryOne(self, s, params=None):
+        return self._runWithConnection(self._queryOne, s, params)
 
     def _insertSQL(self, table, names, values):
         return ("INSERT INTO %s (%s) VALUES (%s)" %
@@ -467,21 +874,52 @@ class DBAPI(DBConnection):
     def queryInsertID(self, soInstance, id, names, values):
         return self._runWithConnection(self._queryInsertID, soInstance, id, names, values)
 
+    def insertMany(self, soClass, names, rows, returnIDs=False):
+        """
+        Inserts `rows`, lists of database values for the columns
+        `names`, into the table of soClass; if returnIDs, returns
+        their ids.
+        """
+        return self._runWithConnection(self._insertMany, soClass, names,
+                                       rows, returnIDs)
+
+    def _insertMany(self, conn, soClass, names, rows, returnIDs):
+        if returnIDs or not names or not self.multiRowInsert:
+            return [self._queryInsertID(conn, soClass, None, names, list(row))
+                    for row in rows]
+        self._query(conn, *self._bindSQL(self.sqlrepr, sqlbuilder.Insert(
+            soClass.sqlmeta.table, valueList=rows, template=names)))
+
     def iterSelect(self, select):
         return select.IterationClass(self, self.getConnection(),
                          select, keepConnection=False)
 
+    def streamSelect(self, select):
+        return select.IterationClass(self, self.getConnection(),
+                         select, keepConnection=False, stream=True)
+
+    def _streamCursor(self, conn):
+        """
+        A cursor that reads the rows of its query from the server as
+        they are fetched, for streamSelect().  This one is a plain
+        cursor, which is what SQLite's cursors already do.
+        """
+        return conn.cursor()
+
     def accumulateSelect(self, select, *expressions):
         """ Apply an accumulate function(s) (SUM, COUNT, MIN, AVG, MAX, etc...)
             to the select object.
         """
-        q = select.queryForSelect().newItems(expressions).unlimited().orderBy(None)
-        q = self.sqlrepr(q)
-        val = self.queryOne(q)
+        val = self.queryOne(*self._compiledSQL(
+            ('accumulate', select._queryParts(), expressions),
+            self._accumulateQuery, select, expressions))
         if len(expressions) == 1:
             val = val[0]
         return val
 
+    def _accumulateQuery(self, select, expressions):
+        return select.queryForSelect().newItems(expressions).unlimited().orderBy(None)
+
     def queryForSelect(self, select):
         return self.sqlrepr(select.queryForSelect())
 
@@ -580,63 +1018,107 @@ class DBAPI(DBConnection):
     # in the SQLObject class.
 
     def _SO_update(self, so, values):
-        self.query("UPDATE %s SET %s WHERE %s = (%s)" %
-                   (so.sqlmeta.table,
-                    ", ".join(["%s = (%s)" % (dbName, self.sqlrepr(value))
-                               for dbName, value in values]),
-                    so.sqlmeta.idName,
-                    self.sqlrepr(so.id)))
+        dbNames = tuple([dbName for dbName, value in values])
+        statement = self._statement(('update', so.__class__, dbNames),
+                                    self._SO_updateSQL, so.sqlmeta.table,
+                                    so.sqlmeta.idName, dbNames)
+        self.query(*statement.render(
+            self, [value for dbName, value in values] + [so.id]))
+        self.cache.invalidateRow(so.id, so.__class__)
+        for column in so.sqlmeta.columnList:
+            if column.alternateID and column.dbName in dbNames:
+                # The new value may have been recorded as missing
+                self.cache.clearMissing(so.__class__)
+                break
+
+    def _SO_updateSQL(self, table, idName, dbNames):
+        return ("UPDATE %s SET %s WHERE %s = (%s)" %
+                (table,
+                 ", ".join(["%s = (%s)" % (dbName, valueSlot)
+                            for dbName in dbNames]),
+                 idName,
+                 valueSlot))
 
     def _SO_selectOne(self, so, columnNames):
-        return self._SO_selectOneAlt(so, columnNames, so.q.id==so.id)
-
+        for name in columnNames:
+            if not isinstance(name, basestring):
+                return self._SO_selectOneAlt(so, columnNames, so.q.id==so.id)
+        columnNames = tuple(columnNames)
+        statement = self._statement(('selectOne', so.__class__, columnNames),
+                                    self._SO_selectOneSQL, so, columnNames)
+        return self.queryOne(*statement.render(self, [so.id]))
+
+    def _SO_selectOneSQL(self, so, columnNames):
+        return self.sqlrepr(sqlbuilder.Select(
+            [sqlbuilder.SQLConstant(x) for x in columnNames] or None,
+            staticTables=[so.sqlmeta.table],
+            clause=so.q.id==sqlbuilder.SQLConstant(valueSlot)))
 
     def _SO_selectOneAlt(self, so, columnNames, condition):
         if columnNames:
             columns = [isinstance(x, basestring) and sqlbuilder.SQLConstant(x) or x for x in columnNames]
         else:
             columns = None
-        return self.queryOne(self.sqlrepr(sqlbuilder.Select(columns,
-                                                            staticTables=[so.sqlmeta.table],
-                                                            clause=condition)))
+        return self.queryOne(*self._bindSQL(self.sqlrepr,
+                                            sqlbuilder.Select(columns,
+                                                              staticTables=[so.sqlmeta.table],
+                                                              clause=condition)))
 
     def _SO_delete(self, so):
-        self.query("DELETE FROM %s WHERE %s = (%s)" %
-                   (so.sqlmeta.table,
-                    so.sqlmeta.idName,
-                    self.sqlrepr(so.id)))
+        statement = self._statement(('delete', so.__class__),
+                                    self._SO_deleteSQL, so.sqlmeta.table,
+                                    so.sqlmeta.idName)
+        self.query(*statement.render(self, [so.id]))
+        self.cache.invalidateRow(so.id, so.__class__)
+
+    def _SO_deleteMany(self, soClass, ids):
+        self.query(*self._bindSQL(self.sqlrepr, sqlbuilder.Delete(
+            soClass.sqlmeta.table, where=sqlbuilder.IN(soClass.q.id, ids))))
+        for id in ids:
+            self.cache.invalidateRow(id, soClass)
+
+    def _SO_deleteSQL(self, table, idName):
+        return ("DELETE FROM %s WHERE %s = (%s)" %
+                (table, idName, valueSlot))
 
     def _SO_selectJoin(self, soClass, column, value):
-        return self.queryAll("SELECT %s FROM %s WHERE %s = (%s)" %
-                             (soClass.sqlmeta.idName,
-                              soClass.sqlmeta.table,
-                              column,
-                              self.sqlrepr(value)))
+        statement = self._statement(('selectJoin', soClass, column),
+                                    self._SO_selectJoinSQL,
+                                    soClass.sqlmeta.idName,
+                                    soClass.sqlmeta.table, column)
+        return self.queryAll(*statement.render(self, [value]))
 
     def _SO_intermediateJoin(self, table, getColumn, joinColumn, value):
-        return self.queryAll("SELECT %s FROM %s WHERE %s = (%s)" %
-                             (getColumn,
-                              table,
-                              joinColumn,
-                              self.sqlrepr(value)))
+        statement = self._statement(
+            ('intermediateJoin', table, getColumn, joinColumn),
+            self._SO_selectJoinSQL, getColumn, table, joinColumn)
+        return self.queryAll(*statement.render(self, [value]))
+
+    def _SO_selectJoinSQL(self, getColumn, table, joinColumn):
+        return ("SELECT %s FROM %s WHERE %s = (%s)" %
+                (getColumn, table, joinColumn, valueSlot))
 
     def _SO_intermediateDelete(self, table, firstColumn, firstValue,
                                secondColumn, secondValue):
-        self.query("DELETE FROM %s WHERE %s = (%s) AND %s = (%s)" %
-                   (table,
-                    firstColumn,
-                    self.sqlrepr(firstValue),
-                    secondColumn,
-                    self.sqlrepr(secondValue)))
+        statement = self._statement(
+            ('intermediateDelete', table, firstColumn, secondColumn),
+            self._SO_intermediateDeleteSQL, table, firstColumn, secondColumn)
+        self.query(*statement.render(self, [firstValue, secondValue]))
+
+    def _SO_intermediateDeleteSQL(self, table, firstColumn, secondColumn):
+        return ("DELETE FROM %s WHERE %s = (%s) AND %s = (%s)" %
+                (table, firstColumn, valueSlot, secondColumn, valueSlot))
 
     def _SO_intermediateInsert(self, table, firstColumn, firstValue,
                                secondColumn, secondValue):
-        self.query("INSERT INTO %s (%s, %s) VALUES (%s, %s)" %
-                   (table,
-                    firstColumn,
-                    secondColumn,
-                    self.sqlrepr(firstValue),
-                    self.sqlrepr(secondValue)))
+        statement = self._statement(
+            ('intermediateInsert', table, firstColumn, secondColumn),
+            self._SO_intermediateInsertSQL, table, firstColumn, secondColumn)
+        self.query(*statement.render(self, [firstValue, secondValue]))
+
+    def _SO_intermediateInsertSQL(self, table, firstColumn, secondColumn):
+        return ("INSERT INTO %s (%s, %s) VALUES (%s, %s)" %
+                (table, firstColumn, secondColumn, valueSlot, valueSlot))
 
     def _SO_columnClause(self, soClass, kw):
         ops = {None: "IS"}
@@ -661,6 +1143,14 @@ class DBAPI(DBConnection):
 
         if not data:
             return None
+        if self.bindParameters:
+            # Rendered with the rest of the query so the values are bound
+            return sqlbuilder.AND(*[
+                value is None and
+                    sqlbuilder.SQLConstant('%s IS NULL' % dbName) or
+                    sqlbuilder.SQLOp('=', sqlbuilder.SQLConstant(dbName),
+                                     value)
+                for dbName, value in data.items()])
         return ' AND '.join(
             ['%s %s %s' %
              (dbName, ops.get(value, "="), self.sqlrepr(value))
@@ -684,9 +1174,13 @@ class DBAPI(DBConnection):
         try:
             if not self._pool: # _pool could be filled in a different thread
                 return
-            conns = self._pool[:]
-            self._pool[:] = []
+            conns = list(self._pool)
+            self._pool.clear()
+            self._poolReleased.clear()
+            self._poolClosed(len(conns))
+            self._poolCondition.notifyAll()
             for conn in conns:
+                self._poolCreated.pop(id(conn), None)
                 try:
                     conn.close()
                 except self.module.Error:
@@ -704,42 +1198,113 @@ class DBAPI(DBConnection):
 
 class Iteration(object):
 
-    def __init__(self, dbconn, rawconn, select, keepConnection=False):
+    def __init__(self, dbconn, rawconn, select, keepConnection=False,
+                 stream=False):
         self.dbconn = dbconn
         self.rawconn = rawconn
         self.select = select
         self.keepConnection = keepConnection
-        self.cursor = rawconn.cursor()
-        self.query = self.dbconn.queryForSelect(select)
+        self.stream = stream
+        if stream:
+            self.cursor = dbconn._streamCursor(rawconn)
+        else:
+            self.cursor = rawconn.cursor()
+        self.query, self.params = self.dbconn._compiledSQL(
+            select._queryParts(), select.queryForSelect)
         if dbconn.debug:
             dbconn.printDebug(rawconn, self.query, 'Select')
-        self.dbconn._executeRetry(self.rawconn, self.cursor, self.query)
+        self.dbconn._executeRetry(self.rawconn, self.cursor, self.query,
+                                  self.params)
+        self.batchSize = select.ops.get('batchSize') or dbconn.batchSize
+        self._batch = []
+        self._batchIndex = 0
 
     def __iter__(self):
         return self
 
     def next(self):
-        result = self.cursor.fetchone()
-        if result is None:
-            self._cleanup()
-            raise StopIteration
+        if self._batchIndex >= len(self._batch):
+            if self.cursor is None:
+                # Closed
+                raise StopIteration
+            rows = self.cursor.fetchmany(self.batchSize)
+            if not rows:
+                self._cleanup()
+                raise StopIteration
+            makeRow = self.select.ops.get('makeRow')
+            if makeRow is not None:
+                # SelectResults.tuples() and friends: no instances
+                self._batch = [makeRow(result) for result in rows]
+            else:
+                self._prefetch(rows)
+                self._prefetchJoins(rows)
+                self._batch = [self._makeObject(result) for result in rows]
+            self._batchIndex = 0
+        obj = self._batch[self._batchIndex]
+        self._batchIndex += 1
+        return obj
+
+    def _prefetch(self, rows):
+        prefetch = self.select.ops.get('prefetch')
+        if prefetch and not self.select.ops.get('lazyColumns', 0):
+            self._prefetched = self.select.sourceClass._SO_prefetch(
+                prefetch, rows, self.dbconn)
+
+    def _prefetchJoins(self, rows):
+        names = self.select.ops.get('prefetchJoins')
+        if names:
+            self._joins = self.select.sourceClass._SO_prefetchJoins(
+                names, [row[0] for row in rows if row[0] is not None],
+                self.dbconn)
+
+    def _setPrefetched(self, obj):
+        prefetched = getattr(self, '_prefetched', None)
+        if prefetched:
+            # Referenced by the instances of the batch, so that an
+            # uncached connection (or an evicting cache) still finds
+            # them while the instances are used
+            obj.sqlmeta._prefetched = prefetched
+        joins = getattr(self, '_joins', None)
+        if joins:
+            obj.sqlmeta._prefetchedJoins = dict(
+                [(name, (lists.get(obj.id, []), changes))
+                 for name, (lists, changes) in joins.items()])
+        return obj
+
+    def _makeObject(self, result):
         if result[0] is None:
             return None
         if self.select.ops.get('lazyColumns', 0):
             obj = self.select.sourceClass.get(result[0], connection=self.dbconn)
-            return obj
+            return self._setPrefetched(obj)
         else:
             obj = self.select.sourceClass.get(result[0], selectResults=result[1:], connection=self.dbconn)
-            return obj
+            return self._setPrefetched(obj)
 
     def _cleanup(self):
         if getattr(self, 'query', None) is None:
             # already cleaned up
             return
         self.query = None
+        if self.stream:
+            # Drops the rows not read yet and frees the server cursor
+            self.cursor.close()
         if not self.keepConnection:
             self.dbconn.releaseConnection(self.rawconn)
         self.dbconn = self.rawconn = self.select = self.cursor = None
+        self._batch = []
+
+    def close(self):
+        """
+        Stop iterating and release the connection.
+        """
+        self._cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cleanup()
 
     def __del__(self):
         self._cleanup()
@@ -752,30 +1317,36 @@ class Transaction(object):
         self._dbConnection = dbConnection
         self._connection = dbConnection.getConnection()
         self._dbConnection._setAutoCommit(self._connection, 0)
-        self.cache = CacheSet(cache=dbConnection.doCache)
+        self.cache = CacheSet(**dbConnection._cacheOptions)
         self._deletedCache = {}
+        self._updatedCache = {}
         self._obsolete = False
 
     def assertActive(self):
         assert not self._obsolete, "This transaction has already gone through ROLLBACK; begin another transaction"
 
-    def query(self, s):
+    def query(self, s, params=None):
         self.assertActive()
-        return self._dbConnection._query(self._connection, s)
+        return self._dbConnection._query(self._connection, s, params)
 
-    def queryAll(self, s):
+    def queryAll(self, s, params=None):
         self.assertActive()
-        return self._dbConnection._queryAll(self._connection, s)
+        return self._dbConnection._queryAll(self._connection, s, params)
 
-    def queryOne(self, s):
+    def queryOne(self, s, params=None):
         self.assertActive()
-        return self._dbConnection._queryOne(self._connection, s)
+        return self._dbConnection._queryOne(self._connection, s, params)
 
     def queryInsertID(self, soInstance, id, names, values):
         self.assertActive()
         return self._dbConnection._queryInsertID(
             self._connection, soInstance, id, names, values)
 
+    def insertMany(self, soClass, names, rows, returnIDs=False):
+        self.assertActive()
+        return self._dbConnection._insertMany(
+            self._connection, soClass, names, rows, returnIDs)
+
     def iterSelect(self, select):
         self.assertActive()
         # We can't keep the cursor open with results in a transaction,
@@ -786,14 +1357,35 @@ class Transaction(object):
         return iter(list(select.IterationClass(self, self._connection,
                                    select, keepConnection=True)))
 
+    def streamSelect(self, select):
+        self.assertActive()
+        # Unlike iterSelect() this reads the rows as they are used:
+        # with some backends (MySQL) the transaction can't run other
+        # queries until the iteration is finished or closed.
+        return select.IterationClass(self, self._connection,
+                                     select, keepConnection=True,
+                                     stream=True)
+
     def _SO_delete(self, inst):
         cls = inst.__class__.__name__
+        self.cache.classes[cls] = inst.__class__
         if not cls in self._deletedCache:
             self._deletedCache[cls] = []
         self._deletedCache[cls].append(inst.id)
         meth = new.instancemethod(self._dbConnection._SO_delete.im_func, self, self.__class__)
         return meth(inst)
 
+    def _SO_deleteMany(self, soClass, ids):
+        self.cache.classes[soClass.__name__] = soClass
+        self._deletedCache.setdefault(soClass.__name__, []).extend(ids)
+        meth = new.instancemethod(self._dbConnection._SO_deleteMany.im_func, self, self.__class__)
+        return meth(soClass, ids)
+
+    def _SO_updated(self, soClass, ids):
+        # The rows updated without instances (SQLObject.updateMany())
+        self.cache.classes[soClass.__name__] = soClass
+        self._updatedCache.setdefault(soClass.__name__, []).extend(ids)
+
     def commit(self, close=False):
         if self._obsolete:
             # @@: is it okay to get extraneous commits?
@@ -803,9 +1395,17 @@ class Transaction(object):
         self._connection.commit()
         subCaches = [(sub[0], sub[1].allIDs()) for sub in self.cache.allSubCachesByClassNames().items()]
         subCaches.extend([(x[0], x[1]) for x in self._deletedCache.items()])
+        subCaches.extend(self._updatedCache.items())
+        cache = self._dbConnection.cache
         for cls, ids in subCaches:
+            cache.clearMissingByName(cls)
+            soClass = self.cache.classes[cls]
             for id in ids:
-                inst = self._dbConnection.cache.tryGetByName(id, cls)
+                # The rows changed by the transaction are only now
+                # visible to other processes; they may have cached
+                # the old ones in the meantime
+                cache.invalidateRow(id, soClass)
+                inst = cache.tryGetByName(id, cls)
                 if inst is not None:
                     inst.expire()
         if close:
@@ -854,6 +1454,7 @@ class Transaction(object):
                                              explicit=True)
         self._connection = None
         self._deletedCache = {}
+        self._updatedCache = {}
 
     def begin(self):
         # @@: Should we do this, or should begin() be a no-op when we're
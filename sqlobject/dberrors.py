@@ -19,3 +19,5 @@ class DataError(DatabaseError): pass
 class NotSupportedError(DatabaseError): pass
 
 class DuplicateEntryError(IntegrityError): pass
+
+class PoolTimeoutError(OperationalError): pass
@@ -226,6 +226,17 @@ def summarize_events_by_sender(sender=None, output=None, indent=0):
             for receiver in sorted(receivers, key=sort_name):
                 print >> output, (' '*indent) + '  ' + nice_repr(receiver)
 
+def hasListeners(soClass, *signals):
+    """
+    Tells if any receiver listens for one of ``signals`` sent by
+    ``soClass``.
+    """
+    for signal in signals:
+        for receiver in dispatcher.liveReceivers(
+                dispatcher.getAllReceivers(soClass, signal)):
+            return True
+    return False
+
 def deref(value):
     if isinstance(value, dispatcher.WEAKREF_TYPES):
         return value()
@@ -9,8 +9,10 @@ kinterbasdb = None
 class FirebirdConnection(DBAPI):
 
     supportTransactions = False
+    multiRowInsert = False
     dbName = 'firebird'
     schemes = [dbName]
+    pingQuery = 'SELECT 1 FROM rdb$database'
 
     limit_re = re.compile('^\s*(select )(.*)', re.IGNORECASE)
 
@@ -38,6 +38,20 @@ class SODatabaseIndex(object):
                     kw[columns[i].foreignName] = args[i]
                 else:
                     kw[columns[i].name] = args[i]
+        names = []
+        values = []
+        for column in columns:
+            names.append(column.name)
+            if column.name in kw:
+                values.append(kw[column.name])
+            else:
+                # A foreign key given by its object or id
+                value = kw.get(column.foreignName)
+                values.append(getattr(value, 'id', value))
+        obj = self.soClass._SO_getAlternate(tuple(names), tuple(values),
+                                            connection)
+        if obj is not None:
+            return obj
         return self.soClass.selectBy(connection=connection, **kw).getOne()
 
     def convertColumns(self, columns):
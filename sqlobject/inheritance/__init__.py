@@ -401,6 +401,15 @@ class InheritableSQLObject(SQLObject):
         obj = result[0]
         return [obj.id], obj
 
+    @classmethod
+    def createMany(cls, rows, returnObjects=False, batchSize=500,
+                   refetch=True, signals=False, connection=None):
+        # A row is spread over the tables of the class and its parents,
+        # so the objects are created one by one.
+        objects = [cls(connection=connection, **row) for row in rows]
+        if returnObjects:
+            return objects
+
     @classmethod
     def select(cls, clause=None, *args, **kwargs):
         parentClass = cls.sqlmeta.parentClass
@@ -449,6 +458,7 @@ class InheritableSQLObject(SQLObject):
                     def _patch_id_clause(clause):
                         if not isinstance(clause, sqlbuilder.SQLOp):
                             return
+                        clause._forgetMemos()
                         expr = _get_patched(clause.expr1)
                         if expr:
                             clause.expr1 = expr
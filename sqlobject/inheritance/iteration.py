@@ -6,10 +6,14 @@ class InheritableIteration(Iteration):
     # Default array size for cursor.fetchmany()
     defaultArraySize = 10000
 
-    def __init__(self, dbconn, rawconn, select, keepConnection=False):
-        super(InheritableIteration, self).__init__(dbconn, rawconn, select, keepConnection)
+    def __init__(self, dbconn, rawconn, select, keepConnection=False,
+                 stream=False):
+        super(InheritableIteration, self).__init__(dbconn, rawconn, select,
+                                                   keepConnection, stream)
         self.lazyColumns = select.ops.get('lazyColumns', False)
-        self.cursor.arraysize = self.defaultArraySize
+        self._makeRow = select.ops.get('makeRow')
+        self.cursor.arraysize = select.ops.get('batchSize') or \
+                                self.defaultArraySize
         self._results = []
         # Find the index of the childName column
         childNameIdx = None
@@ -21,9 +25,18 @@ class InheritableIteration(Iteration):
         self._childNameIdx = childNameIdx
 
     def next(self):
+        if self._makeRow is not None:
+            # SelectResults.tuples() and friends: no instances or children
+            return super(InheritableIteration, self).next()
         if not self._results:
             self._results = list(self.cursor.fetchmany())
-            if not self.lazyColumns: self.fetchChildren()
+            if self.stream:
+                # The connection is busy with the stream; the children
+                # are fetched by .get()
+                self._childrenResults = {}
+            elif not self.lazyColumns: self.fetchChildren()
+            self._prefetch(self._results)
+            self._prefetchJoins(self._results)
         if not self._results:
             self._cleanup()
             raise StopIteration
@@ -31,7 +44,7 @@ class InheritableIteration(Iteration):
         del self._results[0]
         if self.lazyColumns:
             obj = self.select.sourceClass.get(result[0], connection=self.dbconn)
-            return obj
+            return self._setPrefetched(obj)
         else:
             id = result[0]
             if id in self._childrenResults:
@@ -41,7 +54,7 @@ class InheritableIteration(Iteration):
                 childResults = None
             obj = self.select.sourceClass.get(id, selectResults=result[1:],
                 childResults=childResults, connection=self.dbconn)
-            return obj
+            return self._setPrefetched(obj)
 
     def fetchChildren(self):
         """Prefetch childrens' data
@@ -73,10 +86,11 @@ class InheritableIteration(Iteration):
             else:
                 select = klass.select(sqlbuilder.IN(klass.q.id, ids),
                     childUpdate=True, connection=dbconn)
-            query = dbconn.queryForSelect(select)
+            query, params = dbconn._compiledSQL(select._queryParts(),
+                                                select.queryForSelect)
             if dbconn.debug:
                 dbconn.printDebug(rawconn, query, 'Select children of the class %s' % childName)
-            self.dbconn._executeRetry(rawconn, cursor, query)
+            self.dbconn._executeRetry(rawconn, cursor, query, params)
             for result in cursor.fetchall():
                 # Inheritance child classes may have no own columns
                 # (that makes sense when child class has a join
@@ -2,6 +2,7 @@ from py.test import raises
 from sqlobject import *
 from sqlobject.tests.dbtest import *
 from sqlobject.inheritance import InheritableSQLObject
+from sqlobject.sqlbuilder import sqlrepr
 
 ########################################
 ## Inheritance
@@ -132,3 +133,16 @@ def test_addDelColumn():
     assert not hasattr(Employee, 'runtime2')
     assert not hasattr(InheritablePerson.q, 'runtime2')
     assert not hasattr(Employee.q, 'runtime2')
+
+def test_select_patched_clause():
+    setup()
+    employee = Employee.byLastName('Leader')
+    clause = Employee.q.id == employee.id
+    # Rendered (and memoised) before select() patches the id in it
+    assert sqlrepr(clause, 'sqlite') == \
+        '((employee.id) = (%d))' % employee.id
+    assert clause.tablesUsedSet('sqlite') == set(['employee'])
+    assert list(Employee.select(clause)) == [employee]
+    assert sqlrepr(clause, 'sqlite') == \
+        '((inheritable_person.id) = (%d))' % employee.id
+    assert clause.tablesUsedSet('sqlite') == set(['inheritable_person'])
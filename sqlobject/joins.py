@@ -146,6 +146,9 @@ class SOMultipleJoin(SOJoin):
             self.addRemoveName = capword(self.otherClassName)
 
     def performJoin(self, inst):
+        prefetched = _prefetchedJoin(inst, self)
+        if prefetched is not None:
+            return self._applyOrderBy(prefetched, self.otherClass)
         ids = inst._connection._SO_selectJoin(
             self.otherClass,
             self.joinColumn,
@@ -156,6 +159,28 @@ class SOMultipleJoin(SOJoin):
             conn = None
         return self._applyOrderBy([self.otherClass.get(id, conn) for (id,) in ids if id is not None], self.otherClass)
 
+    def prefetchRows(self, ids, connection):
+        """
+        Returns the (id of the instance, joined instance) pairs of the
+        joins of the instances `ids`, with one query.
+        """
+        otherClass = self.otherClass
+        key, where, tables = self._prefetchSource(ids)
+        columns = [otherClass.q.id] + \
+            [getattr(otherClass.q, column.name)
+             for column in otherClass.sqlmeta.columnList]
+        rows = connection.queryAll(*connection._bindSQL(connection.sqlrepr,
+            sqlbuilder.Select(columns + [key], where=where,
+                              staticTables=tables)))
+        return [(row[-1], otherClass.get(row[0], connection,
+                                         selectResults=row[1:-1]))
+                for row in rows]
+
+    def _prefetchSource(self, ids):
+        table = self.otherClass.sqlmeta.table
+        key = sqlbuilder.Field(table, self.joinColumn)
+        return key, sqlbuilder.IN(key, ids), [table]
+
     def _dbNameToPythonName(self):
         for column in self.otherClass.sqlmeta.columns.values():
             if column.dbName == self.joinColumn:
@@ -210,6 +235,9 @@ class SORelatedJoin(SOMultipleJoin):
         return True
 
     def performJoin(self, inst):
+        prefetched = _prefetchedJoin(inst, self)
+        if prefetched is not None:
+            return self._applyOrderBy(prefetched, self.otherClass)
         ids = inst._connection._SO_intermediateJoin(
             self.intermediateTable,
             self.otherColumn,
@@ -221,6 +249,15 @@ class SORelatedJoin(SOMultipleJoin):
             conn = None
         return self._applyOrderBy([self.otherClass.get(id, conn) for (id,) in ids if id is not None], self.otherClass)
 
+    def _prefetchSource(self, ids):
+        otherClass = self.otherClass
+        key = sqlbuilder.Field(self.intermediateTable, self.joinColumn)
+        where = sqlbuilder.AND(
+            sqlbuilder.Field(self.intermediateTable, self.otherColumn)
+                == otherClass.q.id,
+            sqlbuilder.IN(key, ids))
+        return key, where, [otherClass.sqlmeta.table, self.intermediateTable]
+
     def remove(self, inst, other):
         inst._connection._SO_intermediateDelete(
             self.intermediateTable,
@@ -228,6 +265,7 @@ class SORelatedJoin(SOMultipleJoin):
             getID(inst),
             self.otherColumn,
             getID(other))
+        _forgetPrefetchedJoins(inst, other)
 
     def add(self, inst, other):
         inst._connection._SO_intermediateInsert(
@@ -236,6 +274,25 @@ class SORelatedJoin(SOMultipleJoin):
             getID(inst),
             self.otherColumn,
             getID(other))
+        _forgetPrefetchedJoins(inst, other)
+
+def _prefetchedJoin(inst, join):
+    # The prefetched list of the join of inst, if it is still current
+    prefetched = inst.sqlmeta._prefetchedJoins
+    if not prefetched or join.joinMethodName not in prefetched:
+        return None
+    objs, changes = prefetched[join.joinMethodName]
+    if changes != join.otherClass.sqlmeta._rowChanges:
+        # Rows of the joined class changed since
+        del prefetched[join.joinMethodName]
+        return None
+    return list(objs)
+
+def _forgetPrefetchedJoins(*insts):
+    for inst in insts:
+        sqlmeta = getattr(inst, 'sqlmeta', None)
+        if sqlmeta is not None and not isinstance(sqlmeta, type):
+            sqlmeta._prefetchedJoins = None
 
 class RelatedJoin(MultipleJoin):
     baseClass = SORelatedJoin
@@ -27,6 +27,7 @@ USA.
 """
 
 import threading
+import time
 import weakref
 import sqlbuilder
 import dbconnection
@@ -141,6 +142,36 @@ def findDependantColumns(name, klass):
             depends.append(col)
     return depends
 
+# The number of ids put in one IN list by the cascades
+_SO_chunkSize = 500
+
+def _SO_inChunks(column, ids):
+    for start in range(0, len(ids), _SO_chunkSize):
+        yield sqlbuilder.IN(column, ids[start:start+_SO_chunkSize])
+
+def _SO_bulkDestroy(klass):
+    # The rows of classes that don't override destroySelf() can be
+    # deleted together
+    return getattr(klass.destroySelf, 'im_func', None) is \
+        SQLObject.destroySelf.im_func
+
+def _SO_bulkNull(klass, column):
+    # The cascade='null' column of the rows of klass can be set to NULL
+    # together unless .set() must be called for every row: to send the
+    # update signals somebody listens for, or because it is overridden
+    if not klass.sqlmeta.cascadeSignals:
+        return True
+    if events.hasListeners(klass, events.RowUpdateSignal,
+                           events.RowUpdatedSignal):
+        return False
+    return column.name in klass.sqlmeta._plainSetters and \
+        getattr(klass.set, 'im_func', None) is SQLObject.set.im_func
+
+def _SO_freeRelatedJoin(connection, table, column, ids):
+    for where in _SO_inChunks(sqlbuilder.SQLConstant(column), ids):
+        connection.query(*connection._bindSQL(connection.sqlrepr,
+            sqlbuilder.Delete(table, where=where)))
+
 def _collectAttributes(cls, new_attrs, look_for_class):
     """Finds all attributes in `new_attrs` that are instances of
     `look_for_class`. The ``.name`` attribute is set for any matching objects.
@@ -182,6 +213,13 @@ class sqlmeta(object):
     lazyUpdate = False
     defaultOrder = None
     cacheValues = True
+    # Whether the rows deleted by a cascade are loaded to send them
+    # RowDestroySignal/RowDestroyedSignal (and the rows nulled by one
+    # to update them with .set()):
+    cascadeSignals = True
+    # Seconds after which a cached instance is re-fetched by .get();
+    # None means use the connection's cacheTTL (no limit by default):
+    cacheTTL = None
     registry = None
     fromDatabase = False
     # Default is false, but we set it to true for the *instance*
@@ -233,6 +271,23 @@ class sqlmeta(object):
     # Does the row require syncing?
     dirty = False
 
+    # The instances loaded by select(..., prefetch=...) with the batch
+    # of the instance
+    _prefetched = None
+
+    # The lists of the joins loaded by select(..., prefetchJoins=...),
+    # by join name, with the rowChanges of the joined class they were
+    # loaded at
+    _prefetchedJoins = None
+
+    # Counts the rows of the class created, deleted or given another
+    # foreign key through SQLObject; prefetched joins loaded before the
+    # last change are not used
+    _rowChanges = 0
+
+    # When the row was last loaded from the database (see cacheTTL)
+    loadedAt = 0
+
     # Default encoding for UnicodeCol's
     dbEncoding = None
 
@@ -251,6 +306,18 @@ class sqlmeta(object):
     def send(cls, signal, *args, **kw):
         events.send(signal, cls.soClass, *args, **kw)
 
+    @classmethod
+    def _SO_rowsChanged(cls, columns=None):
+        # Rows were created or deleted, or `columns` (names) of them
+        # were updated
+        if columns is not None:
+            for name in columns:
+                if cls.columns[name].foreignKey:
+                    break
+            else:
+                return
+        cls._rowChanges += 1
+
     @classmethod
     def setClass(cls, soClass):
         cls.soClass = soClass
@@ -889,12 +956,18 @@ class SQLObject(object):
         val = cache.get(id, cls)
         if val is None:
             try:
+                if not selectResults and cache.isMissing(id, cls):
+                    raise SQLObjectNotFound, "The object %s by the ID %s does not exist" % (cls.__name__, id)
                 val = cls(_SO_fetch_no_create=1)
                 val._SO_validatorState = sqlbuilder.SQLObjectState(val)
-                val._init(id, connection, selectResults)
+                try:
+                    val._init(id, connection, selectResults)
+                except SQLObjectNotFound:
+                    cache.addMissing(id, cls)
+                    raise
                 cache.put(id, cls, val)
             finally:
-                cache.finishPut(cls)
+                cache.finishPut(cls, id)
         elif selectResults and not val.sqlmeta.dirty:
             val._SO_writeLock.acquire()
             try:
@@ -902,6 +975,19 @@ class SQLObject(object):
                 val.sqlmeta.expired = False
             finally:
                 val._SO_writeLock.release()
+        else:
+            ttl = cls.sqlmeta.cacheTTL
+            if ttl is None:
+                ttl = (connection or cls._connection).cacheTTL
+            if ttl and time.time() - val.sqlmeta.loadedAt > ttl \
+                    and not (val.sqlmeta.dirty or val.sqlmeta.expired):
+                # The cached row is stale; load it again in place
+                try:
+                    val.sync()
+                except SQLObjectNotFound:
+                    cache.expire(id, cls)
+                    cache.addMissing(id, cls)
+                    raise
         return val
 
     @classmethod
@@ -927,11 +1013,16 @@ class SQLObject(object):
             # This flag tells us that:
             self.sqlmeta._perConnection = True
 
+        if not selectResults:
+            # Another process may have loaded the row already
+            cache = self._connection.cache
+            selectResults, version = cache.lookupRow(id, self.__class__)
         if not selectResults:
             dbNames = [col.dbName for col in self.sqlmeta.columnList]
             selectResults = self._connection._SO_selectOne(self, dbNames)
             if not selectResults:
                 raise SQLObjectNotFound, "The object %s by the ID %s does not exist" % (self.__class__.__name__, self.id)
+            cache.storeRow(id, self.__class__, selectResults, version)
         self._SO_selectInit(selectResults)
         self._SO_createValues = {}
         self.sqlmeta.dirty = False
@@ -976,6 +1067,7 @@ class SQLObject(object):
                 raise SQLObjectNotFound, "The object %s by the ID %s has been deleted" % (self.__class__.__name__, self.id)
             self._SO_selectInit(selectResults)
             self.sqlmeta.expired = False
+            self.sqlmeta._prefetchedJoins = None
         finally:
             self._SO_writeLock.release()
 
@@ -988,6 +1080,7 @@ class SQLObject(object):
                 values = [(self.sqlmeta.columns[v[0]].dbName, v[1])
                           for v in self._SO_createValues.items()]
                 self._connection._SO_update(self, values)
+                self.sqlmeta._SO_rowsChanged(self._SO_createValues)
             self.sqlmeta.dirty = False
             self._SO_createValues = {}
         finally:
@@ -999,6 +1092,11 @@ class SQLObject(object):
             func(self)
 
     def expire(self):
+        self._SO_expireValues(True)
+
+    def _SO_expireValues(self, uncache):
+        # Forgets the column values; they are loaded again when used.
+        # Unless `uncache`, the object stays the cached one for its id.
         if self.sqlmeta.expired:
             return
         self._SO_writeLock.acquire()
@@ -1008,7 +1106,9 @@ class SQLObject(object):
             for column in self.sqlmeta.columnList:
                 delattr(self, instanceName(column.name))
             self.sqlmeta.expired = True
-            self._connection.cache.expire(self.id, self.__class__)
+            self.sqlmeta._prefetchedJoins = None
+            if uncache:
+                self._connection.cache.expire(self.id, self.__class__)
             self._SO_createValues = {}
         finally:
             self._SO_writeLock.release()
@@ -1046,9 +1146,11 @@ class SQLObject(object):
         self._connection._SO_update(
             self, [(self.sqlmeta.columns[name].dbName,
                     dbValue)])
+        self.sqlmeta._SO_rowsChanged([name])
 
         if self.sqlmeta.cacheValues:
             setattr(self, instanceName(name), value)
+            self._SO_putAlternates()
 
         post_funcs = []
         self.sqlmeta.send(events.RowUpdatedSignal, self, post_funcs)
@@ -1139,6 +1241,8 @@ class SQLObject(object):
                 args = [(self.sqlmeta.columns[name].dbName, value)
                         for name, value in toUpdate.items()]
                 self._connection._SO_update(self, args)
+                self.sqlmeta._SO_rowsChanged(toUpdate)
+                self._SO_putAlternates()
         finally:
             self._SO_writeLock.release()
 
@@ -1152,6 +1256,59 @@ class SQLObject(object):
             if col.to_python:
                 colValue = col.to_python(colValue, self._SO_validatorState)
             setattr(self, instanceName(col.name), colValue)
+        self.sqlmeta.loadedAt = time.time()
+        self._SO_putAlternates()
+
+    def _SO_putAlternates(self):
+        # Lets byAlternateID() and unique index get() find this object
+        # in the cache
+        if not self.sqlmeta.cacheValues:
+            return
+        cache = self._connection.cache
+        for column in self.sqlmeta.columnList:
+            if column.alternateID:
+                value = getattr(self, instanceName(column.name), NoDefault)
+                if value is not NoDefault:
+                    cache.putAlternate((column.name, value),
+                                       self.__class__, self)
+        for index in self.sqlmeta.indexes:
+            if not index.unique:
+                continue
+            names = []
+            values = []
+            for desc in index.descriptions:
+                if 'column' not in desc:
+                    break
+                name = desc['column'].name
+                names.append(name)
+                values.append(getattr(self, instanceName(name), NoDefault))
+            else:
+                if NoDefault not in values:
+                    cache.putAlternate((tuple(names), tuple(values)),
+                                       self.__class__, self)
+
+    @classmethod
+    def _SO_getAlternate(cls, name, value, connection=None):
+        """
+        Returns the cached object whose alternate key ``name`` (a
+        column name or a tuple of them) is ``value``, or None.
+        """
+        cache = (connection or cls._connection).cache
+        obj = cache.getAlternate((name, value), cls)
+        if obj is None or obj.sqlmeta.dirty or obj.sqlmeta.expired \
+                or obj.sqlmeta._obsolete:
+            return None
+        # The object must still be the cached one and still have the
+        # key: it may have been deleted or changed since it was stored
+        if cache.tryGet(obj.id, cls) is not obj:
+            return None
+        if isinstance(name, str):
+            name = (name,)
+            value = (value,)
+        for n, v in zip(name, value):
+            if getattr(obj, instanceName(n), NoDefault) != v:
+                return None
+        return obj
 
     def _SO_getValue(self, name):
         # Retrieves a single value from the database.  Simple.
@@ -1296,9 +1453,15 @@ class SQLObject(object):
         # non-standard.
         id = self._connection.queryInsertID(self,
                                             id, names, values)
+        self.sqlmeta._SO_rowsChanged()
         cache = self._connection.cache
         cache.created(id, self.__class__, self)
         self._init(id)
+        cache.removeMissing(id, self.__class__)
+        for column in self.sqlmeta.columnList:
+            if column.alternateID:
+                cache.removeMissing((column.name, getattr(self, column.name)),
+                                    self.__class__)
         post_funcs = []
         kw = dict([('class', self.__class__), ('id', id)])
         def _send_RowCreatedSignal():
@@ -1332,7 +1495,16 @@ class SQLObject(object):
 
     @classmethod
     def _SO_fetchAlternateID(cls, name, dbName, value, connection=None, idxName=None):
-        result, obj = cls._findAlternateID(name, dbName, value, connection)
+        obj = cls._SO_getAlternate(name, value, connection)
+        if obj is not None:
+            return obj
+        cache = (connection or cls._connection).cache
+        if cache.isMissing((name, value), cls):
+            result = None
+        else:
+            result, obj = cls._findAlternateID(name, dbName, value, connection)
+            if not result:
+                cache.addMissing((name, value), cls)
         if not result:
             if idxName is None:
                 raise SQLObjectNotFound, "The %s by alternateID %s = %s does not exist" % (cls.__name__, name, repr(value))
@@ -1359,7 +1531,8 @@ class SQLObject(object):
                orderBy=NoDefault, limit=None,
                lazyColumns=False, reversed=False,
                distinct=False, connection=None,
-               join=None, forUpdate=False):
+               join=None, forUpdate=False, batchSize=None,
+               prefetch=None, prefetchJoins=None):
         return cls.SelectResultsClass(cls, clause,
                              clauseTables=clauseTables,
                              orderBy=orderBy,
@@ -1368,7 +1541,10 @@ class SQLObject(object):
                              reversed=reversed,
                              distinct=distinct,
                              connection=connection,
-                             join=join, forUpdate=forUpdate)
+                             join=join, forUpdate=forUpdate,
+                             batchSize=batchSize,
+                             prefetch=prefetch,
+                             prefetchJoins=prefetchJoins)
 
     @classmethod
     def selectBy(cls, connection=None, **kw):
@@ -1511,6 +1687,7 @@ class SQLObject(object):
         # kind of crude anyway, so...
         conn = connection or cls._connection
         conn.clearTable(cls.sqlmeta.table)
+        cls.sqlmeta._SO_rowsChanged()
         if clearJoinTables:
             for join in cls._getJoinsToCreate():
                 conn.clearTable(join.intermediateTable)
@@ -1520,63 +1697,11 @@ class SQLObject(object):
         self.sqlmeta.send(events.RowDestroySignal, self, post_funcs)
         # Kills this object.  Kills it dead!
 
-        klass = self.__class__
-
-        # Free related joins on the base class
-        for join in klass.sqlmeta.joins:
-            if isinstance(join, joins.SORelatedJoin):
-                q = "DELETE FROM %s WHERE %s=%d" % (join.intermediateTable, join.joinColumn, self.id)
-                self._connection.query(q)
-
-        depends = []
-        depends = self._SO_depends()
-        for k in depends:
-            # Free related joins
-            for join in k.sqlmeta.joins:
-                if isinstance(join, joins.SORelatedJoin) and join.otherClassName == klass.__name__:
-                    q = "DELETE FROM %s WHERE %s=%d" % (join.intermediateTable, join.otherColumn, self.id)
-                    self._connection.query(q)
-
-            cols = findDependantColumns(klass.__name__, k)
-
-            # Don't confuse the rest of the process
-            if len(cols) == 0:
-                continue
-
-            query = []
-            delete = setnull = restrict = False
-            for col in cols:
-                if col.cascade == False:
-                    # Found a restriction
-                    restrict = True
-                query.append(getattr(k.q, col.name) == self.id)
-                if col.cascade == 'null':
-                    setnull = col.name
-                elif col.cascade:
-                    delete = True
-            assert delete or setnull or restrict, (
-                "Class %s depends on %s accoriding to "
-                "findDependantColumns, but this seems inaccurate"
-                % (k, klass))
-            query = sqlbuilder.OR(*query)
-            results = k.select(query, connection=self._connection)
-            if restrict:
-                if results.count():
-                    # Restrictions only apply if there are
-                    # matching records on the related table
-                    raise SQLObjectIntegrityError, (
-                        "Tried to delete %s::%s but "
-                        "table %s has a restriction against it" %
-                        (klass.__name__, self.id, k.__name__))
-            else:
-                for row in results:
-                    if delete:
-                        row.destroySelf()
-                    else:
-                        row.set(**{setnull: None})
+        self._SO_destroyDependants([self.id], self._connection)
 
         self.sqlmeta._obsolete = True
         self._connection._SO_delete(self)
+        self.sqlmeta._SO_rowsChanged()
         self._connection.cache.expire(self.id, self.__class__)
 
         for func in post_funcs:
@@ -1587,6 +1712,390 @@ class SQLObject(object):
         for func in post_funcs:
             func(self)
 
+    @classmethod
+    def _SO_prefetch(cls, prefetch, rows, connection):
+        """
+        Loads the instances the ForeignKeys named in `prefetch` (or
+        dotted paths of ForeignKey names, like ``'customer.region'``)
+        refer to from the `rows` of a select, with one select per
+        ForeignKey (in chunks of ids), so that the attribute accesses
+        that follow find them in the cache.  Returns the instances,
+        which the caller keeps referenced while the rows are used.
+        """
+        paths = {}
+        for path in prefetch:
+            name, dot, rest = path.partition('.')
+            paths.setdefault(name, [])
+            if rest:
+                paths[name].append(rest)
+        columns = cls.sqlmeta.columnList
+        kept = []
+        for name, rest in paths.items():
+            for index, column in enumerate(columns):
+                if column.foreignName == name:
+                    break
+            else:
+                raise AttributeError, "%s has no ForeignKey %r to prefetch" % (cls.__name__, name)
+            if column.refColumn:
+                raise ValueError, "Cannot prefetch %s.%s: it doesn't refer to ids" % (cls.__name__, name)
+            otherClass = getattr(cls, '_SO_class_' + column.foreignKey)
+            cache = connection.cache
+            objs = []
+            ids = []
+            seen = set()
+            for row in rows:
+                id = row[index+1]
+                if id is None or id in seen:
+                    continue
+                seen.add(id)
+                # Already loaded by an earlier batch or select?
+                obj = cache.tryGet(id, otherClass)
+                if obj is not None and not (obj.sqlmeta.dirty or
+                                            obj.sqlmeta.expired):
+                    objs.append(obj)
+                else:
+                    ids.append(id)
+            for where in _SO_inChunks(otherClass.q.id, ids):
+                objs.extend(otherClass.select(where, connection=connection))
+            kept.extend(objs)
+            if rest:
+                # The rows of the instances, for their own ForeignKeys
+                names = [instanceName(c.name)
+                         for c in otherClass.sqlmeta.columnList]
+                otherRows = [[obj.id] + [obj.__dict__.get(n) for n in names]
+                             for obj in objs]
+                kept.extend(otherClass._SO_prefetch(rest, otherRows,
+                                                    connection))
+        return kept
+
+    @classmethod
+    def _SO_prefetchJoins(cls, names, ids, connection):
+        """
+        Loads the MultipleJoins and RelatedJoins named in `names` of
+        the instances `ids` with one query per join (in chunks of
+        ids).  Returns {join name: ({id: [joined instances]},
+        rowChanges of the joined class before the queries)}.
+        """
+        result = {}
+        for name in names:
+            for join in cls.sqlmeta.joins:
+                if join.joinMethodName == name:
+                    break
+            else:
+                raise AttributeError, "%s has no join %r to prefetch" % (cls.__name__, name)
+            if not isinstance(join, joins.SOMultipleJoin) or \
+                    isinstance(join, (joins.SOSQLMultipleJoin,
+                                      joins.SOSQLRelatedJoin,
+                                      joins.SOSingleJoin)):
+                raise ValueError, "Cannot prefetch %s.%s: only MultipleJoins and RelatedJoins can be prefetched" % (cls.__name__, name)
+            lists = {}
+            result[name] = lists, join.otherClass.sqlmeta._rowChanges
+            for start in range(0, len(ids), _SO_chunkSize):
+                for id, obj in join.prefetchRows(
+                        ids[start:start+_SO_chunkSize], connection):
+                    lists.setdefault(id, []).append(obj)
+        return result
+
+    @classmethod
+    def _SO_destroyDependants(cls, ids, connection):
+        """
+        Applies the ``cascade`` rules of the foreign keys pointing to
+        the rows `ids`, which are about to be deleted, and frees their
+        RelatedJoins.
+
+        The dependency graph is walked level by level with one SELECT
+        per table and level (in chunks of ids); once no restriction is
+        violated the dependant rows are nulled and deleted with one
+        UPDATE/DELETE per table and level, deepest level first.
+        Classes whose instances don't send signals when cascaded
+        (``sqlmeta.cascadeSignals = False``) aren't even loaded.
+        Classes that override destroySelf() have it called for every
+        row; rows nulled by ``cascade='null'`` get .set() called only
+        if their update signals are listened for (or their setter is
+        overridden).
+        """
+        # levels: [[(class, ids, instances or None), ...], ...]
+        levels = []
+        level = [(cls, list(ids), None)]
+        seen = {cls: set(ids)}
+        while level:
+            levels.append(level)
+            found = {}
+            order = []
+            for parent, parentIDs, objs in level:
+                if objs is not None and not _SO_bulkDestroy(parent):
+                    # Its destroySelf() takes care of its dependants
+                    continue
+                for k in parent._SO_depends():
+                    for col in findDependantColumns(parent.__name__, k):
+                        if col.cascade == False:
+                            for where in _SO_inChunks(
+                                    getattr(k.q, col.name), parentIDs):
+                                if k.select(where,
+                                        connection=connection).count():
+                                    # Restrictions only apply if there
+                                    # are matching records on the
+                                    # related table
+                                    raise SQLObjectIntegrityError, (
+                                        "Tried to delete %s::%s but "
+                                        "table %s has a restriction against it" %
+                                        (parent.__name__, parentIDs[0],
+                                         k.__name__))
+                        elif col.cascade and col.cascade != 'null':
+                            if k not in found:
+                                found[k] = ([], [])
+                                order.append(k)
+                            kIDs, kObjs = found[k]
+                            kSeen = seen.setdefault(k, set())
+                            load = k.sqlmeta.cascadeSignals or \
+                                not _SO_bulkDestroy(k)
+                            for where in _SO_inChunks(
+                                    getattr(k.q, col.name), parentIDs):
+                                if load:
+                                    rows = [(obj.id, obj) for obj in
+                                            k.select(where,
+                                                connection=connection)]
+                                else:
+                                    rows = [(id, None) for (id,) in
+                                            connection.queryAll(
+                                                *connection._bindSQL(
+                                                    connection.sqlrepr,
+                                                    sqlbuilder.Select(
+                                                        [k.q.id], where=where,
+                                                        staticTables=[k.sqlmeta.table])))]
+                                for id, obj in rows:
+                                    if id not in kSeen:
+                                        kSeen.add(id)
+                                        kIDs.append(id)
+                                        kObjs.append(obj)
+            level = [(k, found[k][0], found[k][1]) for k in order
+                     if found[k][0]]
+
+        destroyed = []
+        for level in levels[1:]:
+            for k, kIDs, objs in level:
+                if _SO_bulkDestroy(k) and k.sqlmeta.cascadeSignals:
+                    for obj in objs:
+                        post_funcs = []
+                        obj.sqlmeta.send(events.RowDestroySignal, obj,
+                                         post_funcs)
+                        destroyed.append((obj, post_funcs))
+
+        cache = connection.cache
+        for depth in range(len(levels)-1, -1, -1):
+            for k, kIDs, objs in levels[depth]:
+                if depth and not _SO_bulkDestroy(k):
+                    for obj in objs:
+                        obj.destroySelf()
+                    continue
+                for d in k._SO_depends():
+                    for col in findDependantColumns(k.__name__, d):
+                        if col.cascade != 'null':
+                            continue
+                        for where in _SO_inChunks(
+                                getattr(d.q, col.name), kIDs):
+                            if _SO_bulkNull(d, col):
+                                d.updateMany(where, connection=connection,
+                                             **{col.name: None})
+                            else:
+                                for row in d.select(where,
+                                        connection=connection):
+                                    row.set(**{col.name: None})
+                    # Free related joins
+                    for join in d.sqlmeta.joins:
+                        if isinstance(join, joins.SORelatedJoin) and \
+                                join.otherClassName == k.__name__:
+                            _SO_freeRelatedJoin(connection,
+                                join.intermediateTable, join.otherColumn,
+                                kIDs)
+                # Free related joins on the class
+                for join in k.sqlmeta.joins:
+                    if isinstance(join, joins.SORelatedJoin):
+                        _SO_freeRelatedJoin(connection,
+                            join.intermediateTable, join.joinColumn, kIDs)
+                if not depth:
+                    continue
+                for start in range(0, len(kIDs), _SO_chunkSize):
+                    connection._SO_deleteMany(
+                        k, kIDs[start:start+_SO_chunkSize])
+                k.sqlmeta._SO_rowsChanged()
+                for id in kIDs:
+                    obj = cache.tryGet(id, k)
+                    if obj is not None:
+                        obj.sqlmeta._obsolete = True
+                    cache.expire(id, k)
+
+        for obj, post_funcs in destroyed:
+            for func in post_funcs:
+                func(obj)
+            post_funcs = []
+            obj.sqlmeta.send(events.RowDestroyedSignal, obj, post_funcs)
+            for func in post_funcs:
+                func(obj)
+
+    @classmethod
+    def updateMany(cls, where=NoDefault, connection=None, **values):
+        """
+        Sets the columns in `values` (keyword arguments as for .set(),
+        or sqlbuilder expressions) in every row matching `where` (None
+        for all rows) with one UPDATE.  The cached instances of the
+        rows load their values again when next used; no signals are
+        sent.
+        """
+        if where is NoDefault:
+            raise TypeError, "You must give a where clause or pass in None to indicate no where clause"
+        if where is None:
+            where = NoDefault
+        cls._SO_updateMany(connection or cls._connection, values,
+                           where=where)
+
+    @classmethod
+    def _SO_updateMany(cls, conn, values, where=NoDefault, ids=None):
+        # Sets `values` in the rows matching `where`, or in the rows
+        # `ids` with IN lists (MySQL can't update the rows a subquery
+        # on the same table selects)
+        state = sqlbuilder.SQLObjectState(cls, connection=conn)
+        dbValues = {}
+        alternateID = foreignKey = False
+        for name, value in values.items():
+            for column in cls.sqlmeta.columnList:
+                if name == column.name:
+                    break
+                if name == column.foreignName:
+                    value = getID(value, column.refColumn)
+                    break
+            else:
+                raise TypeError, "%s.updateMany() got an unexpected keyword argument %s" % (cls.__name__, name)
+            if column.from_python and \
+                    not isinstance(value, sqlbuilder.SQLExpression):
+                value = column.from_python(value, state)
+            dbValues[column.dbName] = value
+            alternateID = alternateID or column.alternateID
+            foreignKey = foreignKey or column.foreignKey
+        if not dbValues:
+            return
+        cache = conn.cache
+        transaction = isinstance(conn, dbconnection.Transaction)
+        if ids is not None:
+            for clause in _SO_inChunks(cls.q.id, ids):
+                conn.query(*conn._bindSQL(conn.sqlrepr,
+                    sqlbuilder.Update(cls.sqlmeta.table, dbValues,
+                                      where=clause)))
+        else:
+            if transaction or cache.shared is not None or \
+                    cache.allIDs(cls):
+                # The rows to expire (the commit of a transaction
+                # expires them for the other connections too); the
+                # clause may not match them after the update
+                ids = [id for (id,) in conn.queryAll(
+                    *conn._bindSQL(conn.sqlrepr,
+                        sqlbuilder.Select([cls.q.id], where=where,
+                            staticTables=[cls.sqlmeta.table])))]
+            conn.query(*conn._bindSQL(conn.sqlrepr,
+                sqlbuilder.Update(cls.sqlmeta.table, dbValues, where=where)))
+        if foreignKey:
+            cls.sqlmeta._SO_rowsChanged()
+        if transaction:
+            conn._SO_updated(cls, ids)
+        for id in ids or ():
+            cache.invalidateRow(id, cls)
+            obj = cache.tryGet(id, cls)
+            if obj is not None:
+                obj._SO_expireValues(False)
+        if alternateID:
+            # The new values may have been recorded as missing
+            cache.clearMissing(cls)
+
+    @classmethod
+    def createMany(cls, rows, returnObjects=False, batchSize=500,
+                   refetch=True, signals=False, connection=None):
+        """
+        Inserts `rows`, dictionaries of the keyword arguments you would
+        pass to the constructor, with as few statements as possible.
+        Defaults and validators are applied as by the constructor.
+        With returnObjects the new instances are returned; with
+        refetch=False they are made from the values given instead of
+        being selected back (which is only possible if no column has
+        its value set by the database).  With signals RowCreatedSignal
+        is sent for every new row.
+        """
+        conn = connection or cls._connection
+        state = sqlbuilder.SQLObjectState(cls, connection=conn)
+        wantObjects = returnObjects or signals
+        objects = []
+        batch = []
+        batchNames = None
+        for row in rows:
+            names, values = cls._SO_createManyValues(row, state)
+            if batch and (names != batchNames or len(batch) >= batchSize):
+                objects.extend(cls._SO_createManyBatch(
+                    conn, batchNames, batch, wantObjects, refetch))
+                batch = []
+            batchNames = names
+            batch.append(values)
+        if batch:
+            objects.extend(cls._SO_createManyBatch(
+                conn, batchNames, batch, wantObjects, refetch))
+        cls.sqlmeta._SO_rowsChanged()
+        # The new rows may have been recorded as missing
+        conn.cache.clearMissing(cls)
+        if signals:
+            for obj in objects:
+                post_funcs = []
+                kw = dict([('class', cls), ('id', obj.id)])
+                cls.sqlmeta.send(events.RowCreatedSignal, obj, kw, post_funcs)
+                for func in post_funcs:
+                    func(obj)
+        if returnObjects:
+            return objects
+
+    @classmethod
+    def _SO_createManyValues(cls, row, state):
+        # Returns the database names and values createMany() inserts
+        kw = row.copy()
+        names = []
+        values = []
+        if 'id' in kw:
+            names.append(cls.sqlmeta.idName)
+            values.append(kw.pop('id'))
+        for column in cls.sqlmeta.columnList:
+            if column.name in kw:
+                value = kw.pop(column.name)
+            elif column.foreignName in kw:
+                value = getID(kw.pop(column.foreignName), column.refColumn)
+            else:
+                value = column.default
+                if value is NoDefault:
+                    if column.defaultSQL is None:
+                        raise TypeError, "%s.createMany() did not get expected keyword argument '%s'" % (cls.__name__, column.name)
+                    # The backend creates the value
+                    continue
+            if column.from_python:
+                value = column.from_python(value, state)
+            names.append(column.dbName)
+            values.append(value)
+        if kw:
+            raise TypeError, "%s.createMany() got unexpected keyword argument(s): %s" % (cls.__name__, ', '.join(kw.keys()))
+        return tuple(names), values
+
+    @classmethod
+    def _SO_createManyBatch(cls, conn, names, rows, wantObjects, refetch):
+        if not wantObjects:
+            conn.insertMany(cls, names, rows)
+            return []
+        ids = conn.insertMany(cls, names, rows, returnIDs=True)
+        dbNames = [column.dbName for column in cls.sqlmeta.columnList]
+        if refetch or [dbName for dbName in dbNames if dbName not in names]:
+            objects = dict([(obj.id, obj) for obj in cls.select(
+                sqlbuilder.IN(cls.q.id, ids), connection=conn)])
+            return [objects[id] for id in ids]
+        objects = []
+        for id, values in zip(ids, rows):
+            row = dict(zip(names, values))
+            objects.append(cls.get(id, connection=conn,
+                selectResults=[row[dbName] for dbName in dbNames]))
+        return objects
+
     @classmethod
     def delete(cls, id, connection=None):
         obj = cls.get(id, connection=connection)
@@ -1594,14 +2103,35 @@ class SQLObject(object):
 
     @classmethod
     def deleteMany(cls, where=NoDefault, connection=None):
-        conn = connection or cls._connection
-        conn.query(conn.sqlrepr(sqlbuilder.Delete(cls.sqlmeta.table, where)))
+        cls._SO_deleteWhere(connection or cls._connection, where)
 
     @classmethod
     def deleteBy(cls, connection=None, **kw):
         conn = connection or cls._connection
-        conn.query(conn.sqlrepr(sqlbuilder.Delete(cls.sqlmeta.table,
-            conn._SO_columnClause(cls, kw))))
+        cls._SO_deleteWhere(conn, conn._SO_columnClause(cls, kw))
+
+    @classmethod
+    def _SO_deleteWhere(cls, conn, where):
+        # Deletes the rows matching `where`; the cached and shared
+        # copies of the rows are invalidated by id, as by updateMany()
+        cache = conn.cache
+        if isinstance(conn, dbconnection.Transaction) or \
+                cache.shared is not None or cache.allIDs(cls):
+            ids = [id for (id,) in conn.queryAll(
+                *conn._bindSQL(conn.sqlrepr,
+                    sqlbuilder.Select([cls.q.id], where=where,
+                        staticTables=[cls.sqlmeta.table])))]
+            for start in range(0, len(ids), _SO_chunkSize):
+                conn._SO_deleteMany(cls, ids[start:start+_SO_chunkSize])
+            for id in ids:
+                obj = cache.tryGet(id, cls)
+                if obj is not None:
+                    obj.sqlmeta._obsolete = True
+                cache.expire(id, cls)
+        else:
+            conn.query(*conn._bindSQL(conn.sqlrepr,
+                sqlbuilder.Delete(cls.sqlmeta.table, where)))
+        cls.sqlmeta._SO_rowsChanged()
 
     def __repr__(self):
         if not hasattr(self, 'id'):
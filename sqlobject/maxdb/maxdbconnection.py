@@ -56,8 +56,10 @@ SAPDBMAX_ID_LENGTH=32
 class MaxdbConnection(DBAPI):
 
     supportTransactions = True
+    multiRowInsert = False
     dbName = 'maxdb'
     schemes = [dbName]
+    pingQuery = 'SELECT 1 FROM DUAL'
 
     def __init__ (self, host='', port=None, user=None, password=None,
                   database=None, autoCommit=1, sqlmode='internal',
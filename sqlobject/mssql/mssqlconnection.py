@@ -5,6 +5,7 @@ import re
 class MSSQLConnection(DBAPI):
 
     supportTransactions = True
+    multiRowInsert = False
     dbName = 'mssql'
     schemes = [dbName]
 
@@ -89,7 +89,11 @@ class MySQLConnection(DBAPI):
         if hasattr(conn, 'autocommit'):
             conn.autocommit(auto)
 
-    def _executeRetry(self, conn, cursor, query):
+    def _streamCursor(self, conn):
+        # SSCursor reads the rows from the server as they are fetched
+        return conn.cursor(self.module.cursors.SSCursor)
+
+    def _executeRetry(self, conn, cursor, query, params=None):
         if self.need_unicode and not isinstance(query, unicode):
             try:
                 query = unicode(query, self.dbEncoding)
@@ -110,7 +114,9 @@ class MySQLConnection(DBAPI):
         # done by calling ping(True) on the connection.
         for count in range(3):
             try:
-                return cursor.execute(query)
+                if params is None:
+                    return cursor.execute(query)
+                return cursor.execute(query, params)
             except self.module.OperationalError, e:
                 if e.args[0] in (self.module.constants.CR.SERVER_GONE_ERROR, self.module.constants.CR.SERVER_LOST):
                     if count == 2:
@@ -149,10 +155,10 @@ class MySQLConnection(DBAPI):
         if id is not None:
             names = [idName] + names
             values = [id] + values
-        q = self._insertSQL(table, names, values)
+        q, params = self._bindSQL(self._insertSQL, table, names, values)
         if self.debug:
             self.printDebug(conn, q, 'QueryIns')
-        self._executeRetry(conn, c, q)
+        self._executeRetry(conn, c, q, params)
         if id is None:
             try:
                 id = c.lastrowid
@@ -22,6 +22,8 @@ class PostgresConnection(DBAPI):
     supportTransactions = True
     dbName = 'postgres'
     schemes = [dbName, 'postgresql']
+    # Names the server-side cursors of streamSelect()
+    _streamCount = 0
 
     def __init__(self, dsn=None, host=None, port=None, db=None,
                  user=None, password=None, **kw):
@@ -128,6 +130,15 @@ class PostgresConnection(DBAPI):
             path = path_parts[-1]
         return cls(host=host, port=port, db=path, user=user, password=password, **args)
 
+    def _streamCursor(self, conn):
+        if self.module.__name__ != 'psycopg2':
+            return conn.cursor()
+        # A named cursor fetches its rows from the server as they are
+        # read; WITH HOLD lets it work outside of a transaction.
+        self._streamCount += 1
+        return conn.cursor('sqlobject_stream_%d' % self._streamCount,
+                           withhold=True)
+
     def _setAutoCommit(self, conn, auto):
         # psycopg2 does not have an autocommit method.
         if hasattr(conn, 'autocommit'):
@@ -157,11 +168,15 @@ class PostgresConnection(DBAPI):
             self._executeRetry(conn, c, "SET client_encoding TO '%s'" % dbEncoding)
         return conn
 
-    def _executeRetry(self, conn, cursor, query):
+    def _executeRetry(self, conn, cursor, query, params=None):
         if self.debug:
             self.printDebug(conn, query, 'QueryR')
+            if params is not None:
+                self.printDebug(conn, params, 'QueryR', 'params')
         try:
-            return cursor.execute(query)
+            if params is None:
+                return cursor.execute(query)
+            return cursor.execute(query, params)
         except self.module.OperationalError, e:
             raise OperationalError(ErrorMessage(e))
         except self.module.IntegrityError, e:
@@ -197,20 +212,36 @@ class PostgresConnection(DBAPI):
             names = [idName] + names
             values = [id] + values
         if names and values:
-            q = self._insertSQL(table, names, values)
+            q, params = self._bindSQL(self._insertSQL, table, names, values)
         else:
-            q = "INSERT INTO %s DEFAULT VALUES" % table
+            q, params = "INSERT INTO %s DEFAULT VALUES" % table, None
         if id is None:
             q += " RETURNING " + idName
         if self.debug:
             self.printDebug(conn, q, 'QueryIns')
-        self._executeRetry(conn, c, q)
+        self._executeRetry(conn, c, q, params)
         if id is None:
             id = c.fetchone()[0]
         if self.debugOutput:
             self.printDebug(conn, id, 'QueryIns', 'result')
         return id
 
+    def _insertMany(self, conn, soClass, names, rows, returnIDs):
+        if not (returnIDs and names):
+            return DBAPI._insertMany(self, conn, soClass, names, rows,
+                                     returnIDs)
+        q, params = self._bindSQL(self.sqlrepr, sqlbuilder.Insert(
+            soClass.sqlmeta.table, valueList=rows, template=names))
+        q += " RETURNING " + soClass.sqlmeta.idName
+        if self.debug:
+            self.printDebug(conn, q, 'QueryIns')
+        c = conn.cursor()
+        self._executeRetry(conn, c, q, params)
+        ids = [row[0] for row in c.fetchall()]
+        if self.debugOutput:
+            self.printDebug(conn, ids, 'QueryIns', 'result')
+        return ids
+
     @classmethod
     def _queryAddLimitOffset(cls, query, start, end):
         if not start:
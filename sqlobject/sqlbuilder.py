@@ -68,7 +68,8 @@ import types
 import weakref
 
 import classregistry
-from converters import registerConverter, sqlrepr, quote_str, unquote_str
+from converters import registerConverter, lookupConverter, sqlrepr, \
+     quote_str, unquote_str, isBinding, literal_sqlrepr
 
 
 class VersionError(Exception):
@@ -101,11 +102,23 @@ def _str_or_sqlrepr(expr, db):
         return expr
     return sqlrepr(expr, db)
 
+def _str_or_literal_sqlrepr(expr, db):
+    if isinstance(expr, basestring):
+        return expr
+    return literal_sqlrepr(expr, db)
+
 ########################################
 ## Expression generation
 ########################################
 
 class SQLExpression:
+    # The attributes whose strings are SQL text (names, operators)
+    # rather than values, for compileShape()
+    _shapeLiterals = ()
+    # False for the nodes whose SQL depends on more than their
+    # attributes and the dialect; see _isFrozen()
+    _memoisable = True
+
     def __add__(self, other):
         return SQLOp("+", self, other)
     def __radd__(self, other):
@@ -198,17 +211,82 @@ class SQLExpression:
     def tablesUsed(self, db):
         return self.tablesUsedSet(db)
     def tablesUsedSet(self, db):
+        memo = self.__dict__.get('_tablesUsed')
+        if memo is not None and db in memo:
+            return set(memo[db])
         tables = set()
         for table in self.tablesUsedImmediate():
             if hasattr(table, '__sqlrepr__'):
-                table = sqlrepr(table, db)
+                # Always quoted, so the tables compare equal however
+                # they are rendered (a subquery may be a table)
+                table = literal_sqlrepr(table, db)
             tables.add(table)
-        for component in self.components():
+        components = self.components()
+        for component in components:
             tables.update(tablesUsedSet(component, db))
+        # The leaves are as quick to walk again
+        if components and self._isFrozen():
+            if memo is None:
+                memo = self.__dict__['_tablesUsed'] = {}
+            memo[db] = frozenset(tables)
         return tables
     def tablesUsedImmediate(self):
         return []
 
+    def _isFrozen(self):
+        """
+        True if the SQL and the tables of the node can be memoised:
+        the nodes are not changed once built, but a list or a dict in
+        them may be, and some nodes resolve their SQL late.
+        """
+        attrs = self.__dict__
+        frozen = attrs.get('_frozen')
+        if frozen is None:
+            # Not frozen while it is checked, for the nodes that refer
+            # to themselves
+            attrs['_frozen'] = False
+            literals = self._shapeLiterals
+            frozen = self._memoisable
+            for name, value in attrs.items():
+                if not frozen:
+                    break
+                if name not in literals and name not in _memoAttributes:
+                    frozen = _isFrozenValue(value)
+            attrs['_frozen'] = frozen
+        return frozen
+
+    def _forgetMemos(self):
+        # For the code that changes a node after all
+        for name in _memoAttributes:
+            self.__dict__.pop(name, None)
+
+    def _sqlFragment(self, reprFunc, db):
+        # sqlrepr() of the node outside of bindParameters(), memoised
+        # per dialect for the frozen nodes
+        memo = self.__dict__.get('_sqlFragments')
+        if memo is None:
+            if not self._isFrozen():
+                return reprFunc(db)
+            memo = self.__dict__['_sqlFragments'] = {}
+        try:
+            return memo[db]
+        except KeyError:
+            sql = memo[db] = reprFunc(db)
+            return sql
+
+def _isFrozenValue(value):
+    cls = type(value)
+    if cls in _slotTypes:
+        return True
+    if cls is tuple:
+        for item in value:
+            if not _isFrozenValue(item):
+                return False
+        return True
+    if isinstance(value, SQLExpression):
+        return value._isFrozen()
+    return isinstance(value, (type, types.ClassType))
+
 #######################################
 # Converter for SQLExpression instances
 #######################################
@@ -240,6 +318,7 @@ operatorMap = {
     }
 
 class SQLOp(SQLExpression):
+    _shapeLiterals = ('op',)
     def __init__(self, op, expr1, expr2):
         self.op = op.upper()
         self.expr1 = expr1
@@ -335,6 +414,7 @@ registerConverter(SQLTrueClauseClass, SQLExprConverter)
 ########################################
 
 class Field(SQLExpression):
+    _shapeLiterals = ('tableName', 'fieldName')
     def __init__(self, tableName, fieldName):
         self.tableName = tableName
         self.fieldName = fieldName
@@ -346,6 +426,8 @@ class Field(SQLExpression):
         return executor.field(self.tableName, self.fieldName)
 
 class SQLObjectField(Field):
+    _shapeLiterals = ('tableName', 'fieldName', 'original', 'soClass',
+                      'column')
     def __init__(self, tableName, fieldName, original, soClass, column):
         Field.__init__(self, tableName, fieldName)
         self.original = original
@@ -381,6 +463,7 @@ registerConverter(SQLObjectField, SQLExprConverter)
 
 class Table(SQLExpression):
     FieldClass = Field
+    _shapeLiterals = ('tableName',)
 
     def __init__(self, tableName):
         self.tableName = tableName
@@ -484,6 +567,7 @@ class AliasField(Field):
 
 class AliasTable(Table):
     as_string = '' # set it to "AS" if your database requires it
+    _memoisable = False
     FieldClass = AliasField
 
     _alias_lock = threading.Lock()
@@ -645,7 +729,7 @@ class Select(SQLExpression):
         tables = set()
         for x in self.ops['staticTables']:
             if isinstance(x, SQLExpression):
-                x = sqlrepr(x, db)
+                x = literal_sqlrepr(x, db)
             tables.add(x)
         things = list(self.ops['items']) + join
         if self.ops['clause'] is not NoDefault:
@@ -654,9 +738,9 @@ class Select(SQLExpression):
             if isinstance(thing, SQLExpression):
                 tables.update(tablesUsedSet(thing, db))
         for j in join:
-            t1 = _str_or_sqlrepr(j.table1, db)
+            t1 = _str_or_literal_sqlrepr(j.table1, db)
             if t1 in tables: tables.remove(t1)
-            t2 = _str_or_sqlrepr(j.table2, db)
+            t2 = _str_or_literal_sqlrepr(j.table2, db)
             if t2 in tables: tables.remove(t2)
         if tables:
             select += " FROM %s" % ", ".join(tables)
@@ -920,6 +1004,10 @@ class _LikeQuoted:
             else:
                 return " || ".join(values)
         elif isinstance(s, basestring):
+            if isBinding():
+                # Bind the whole pattern; only LIKE's own escaping applies
+                s = s.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                return sqlrepr("%s%s%s" % (self.prefix, s, self.postfix), db)
             s = _quote_like_special(unquote_str(sqlrepr(s, db)), db)
             return quote_str("%s%s%s" % (self.prefix, s, self.postfix), db)
         else:
@@ -1247,6 +1335,7 @@ class ImportProxy(SQLExpression):
         not yet be in a classregistry.
     '''
     FieldClass = ImportProxyField
+    _memoisable = False
     def __init__(self, clsName, registry=None):
         self.tableName = _DelayClass(self, clsName)
         self.sqlmeta = _Delay_proxy(table=_DelayClass(self, clsName))
@@ -1263,6 +1352,7 @@ class ImportProxy(SQLExpression):
         return getattr(self.soClass.q, attr)
 
 class _Delay(SQLExpression):
+    _memoisable = False
     def __init__(self, proxy, attr):
         self.attr = attr
         self.proxy = proxy
@@ -1305,6 +1395,100 @@ class _Delay_proxy(object):
 ######
 
 
+########################################
+## Compiling
+########################################
+
+_valueSlot = object()
+
+def compileShape(expr, values):
+    """
+    Returns a hashable key for the shape of `expr`, a tree of
+    SQLExpressions, lists, tuples and dicts: the key is the same for
+    the trees that differ only in the values sqlrepr() renders with a
+    converter (strings, numbers, dates and so on), which are appended
+    to `values` in the order of the walk.  Raises TypeError for trees
+    that cannot be keyed.
+    """
+    cls = type(expr)
+    if cls is types.InstanceType:
+        cls = expr.__class__
+    if cls in _slotTypes:
+        values.append(expr)
+        return _valueSlot
+    if cls in _literalClasses:
+        return expr
+    if isinstance(expr, SQLExpression):
+        attrs = expr.__dict__
+        memo = attrs.get('_compiledShape')
+        if memo is not None:
+            values.extend(memo[1])
+            return memo[0]
+        if cls in _noShapeClasses:
+            # Resolved when the class is registered
+            raise TypeError("Cannot compile %r" % expr)
+        literals = cls._shapeLiterals
+        key = [cls]
+        start = len(values)
+        # The nodes are not changed once built, but a list or a dict in
+        # them may be
+        frozen = True
+        for name, value in attrs.iteritems():
+            if name in _memoAttributes:
+                continue
+            if name in literals and not isinstance(value, SQLExpression):
+                key.append((name, value))
+            elif type(value) in _slotTypes:
+                values.append(value)
+                key.append((name, _valueSlot))
+            else:
+                key.append((name, compileShape(value, values)))
+                if isinstance(value, SQLExpression):
+                    frozen = frozen and '_compiledShape' in value.__dict__
+                else:
+                    frozen = False
+        key = tuple(key)
+        if frozen:
+            attrs['_compiledShape'] = (key, tuple(values[start:]))
+        return key
+    if cls is tuple or cls is list:
+        key = [cls]
+        for item in expr:
+            if type(item) in _slotTypes:
+                values.append(item)
+                key.append(_valueSlot)
+            else:
+                key.append(compileShape(item, values))
+        return tuple(key)
+    if cls is dict:
+        return (dict,) + tuple([(key, compileShape(expr[key], values))
+                                for key in sorted(expr)])
+    if isinstance(expr, (type, types.ClassType)):
+        _literalClasses.add(cls)
+        return expr
+    if cls is set or cls is frozenset:
+        # No order
+        raise TypeError("Cannot compile %r" % expr)
+    if lookupConverter(expr) is not None:
+        values.append(expr)
+        return _valueSlot
+    if hasattr(expr, '__sqlrepr__') or \
+            isinstance(expr, (types.FunctionType, types.MethodType)):
+        raise TypeError("Cannot compile %r" % expr)
+    hash(expr)
+    if isinstance(cls, type):
+        _literalClasses.add(cls)
+    return expr
+
+_slotTypes = set([str, unicode, int, long, float, bool, types.NoneType])
+_noShapeClasses = set([ImportProxy, _Delay, _DelayClass])
+# The classes (columns, metaclasses) whose objects are keyed as they are
+_literalClasses = set()
+# The attributes the nodes memoise their results in
+_memoAttributes = set(['_compiledShape', '_frozen', '_tablesUsed',
+                       '_sqlFragments'])
+
+
 ########################################
 ## Global initializations
 ########################################
@@ -146,18 +146,16 @@ class SQLiteConnection(DBAPI):
                 self._threadOrigination[id(conn)] = threadid
             self._connectionNumbers[id(conn)] = self._connectionCount
             self._connectionCount += 1
-        if self.debug:
-            s = 'ACQUIRE'
-            if self._pool is not None:
-                s += ' pool=[%s]' % ', '.join([str(self._connectionNumbers[id(v)]) for v in self._pool])
-            self.printDebug(conn, s, 'Pool')
+        self._debugPool(conn, 'ACQUIRE')
         return conn
 
     def releaseConnection(self, conn, explicit=False):
         if self._memory:
             return
         threadid = self._threadOrigination.get(id(conn))
-        DBAPI.releaseConnection(self, conn, explicit=explicit)
+        self._finishConnection(conn, explicit=explicit)
+        if self._pool is not None and conn not in self._pool:
+            self._pool.appendleft(conn)
         if (self._pool is not None and threadid
             and threadid not in self._threadPool):
             self._threadPool[threadid] = conn
@@ -201,11 +199,15 @@ class SQLiteConnection(DBAPI):
             self._memoryConn.close()
             self.makeMemoryConnection()
 
-    def _executeRetry(self, conn, cursor, query):
+    def _executeRetry(self, conn, cursor, query, params=None):
         if self.debug:
             self.printDebug(conn, query, 'QueryR')
+            if params is not None:
+                self.printDebug(conn, params, 'QueryR', 'params')
         try:
-            return cursor.execute(query)
+            if params is None:
+                return cursor.execute(query)
+            return cursor.execute(query, params)
         except self.module.OperationalError, e:
             raise OperationalError(ErrorMessage(e))
         except self.module.IntegrityError, e:
@@ -239,10 +241,10 @@ class SQLiteConnection(DBAPI):
         if id is not None:
             names = [idName] + names
             values = [id] + values
-        q = self._insertSQL(table, names, values)
+        q, params = self._bindSQL(self._insertSQL, table, names, values)
         if self.debug:
             self.printDebug(conn, q, 'QueryIns')
-        self._executeRetry(conn, c, q)
+        self._executeRetry(conn, c, q, params)
         # lastrowid is a DB-API extension from "PEP 0249":
         if id is None:
             id = int(c.lastrowid)
@@ -1,10 +1,68 @@
+import array
+import itertools
+import operator
+import classregistry
+import col
 import dbconnection
 import joins
 import main
 import sqlbuilder
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 __all__ = ['SelectResults']
 
+def _arrayTypecode(cls, column):
+    # The array.array typecode of the values of column (None for the id),
+    # None if they don't fit
+    if column is None or isinstance(column, col.SOKeyCol):
+        if column is not None and column.foreignKey:
+            cls = classregistry.findClass(column.foreignKey,
+                                          cls.sqlmeta.registry)
+        if cls.sqlmeta.idType is int:
+            return 'l'
+        return None
+    if isinstance(column, col.SOBoolCol):
+        return 'b'
+    if isinstance(column, col.SOIntCol):
+        return 'l'
+    if isinstance(column, (col.SOFloatCol, col.SODecimalCol)):
+        return 'd'
+    return None
+
+def _coerceValues(name, typecode, values):
+    if typecode == 'd':
+        return [value is None and _nan or float(value) for value in values]
+    if None in values:
+        raise ValueError("Column %r has NULLs, which can't be put in an "
+                         "integer array" % name)
+    return [int(value) for value in values]
+
+_nan = float('nan')
+
+def _numpyArray(values):
+    if isinstance(values, list):
+        result = numpy.empty(len(values), dtype=object)
+        result[:] = values
+        return result
+    result = numpy.frombuffer(values, dtype=values.typecode)
+    if values.typecode == 'b':
+        result = result.view(numpy.bool_)
+    return result
+
+def _selectColumns(cls):
+    # The items of the selects of cls, kept until its columns change
+    columnList = cls.sqlmeta.columnList
+    cached = cls.sqlmeta.__dict__.get('_selectColumns')
+    if cached is None or cached[0] != columnList:
+        cached = (list(columnList),
+                  [cls.q.id] + [getattr(cls.q, column.name)
+                                for column in columnList])
+        cls.sqlmeta._selectColumns = cached
+    return list(cached[1])
+
 class SelectResults(object):
     IterationClass = dbconnection.Iteration
 
@@ -42,7 +100,12 @@ class SelectResults(object):
         self.tables = list(tablesSet) + [sourceClass.sqlmeta.table]
 
     def queryForSelect(self):
-        columns = [self.sourceClass.q.id] + [getattr(self.sourceClass.q, x.name) for x in self.sourceClass.sqlmeta.columnList]
+        valueColumns = self.ops.get('valueColumns')
+        if valueColumns:
+            q = self.sourceClass.q
+            columns = [getattr(q, name) for name in valueColumns]
+        else:
+            columns = _selectColumns(self.sourceClass)
         query = sqlbuilder.Select(columns,
                                   where=self.clause,
                                   join=self.ops.get('join', sqlbuilder.NoDefault),
@@ -56,6 +119,19 @@ class SelectResults(object):
                                   forUpdate=self.ops.get('forUpdate', False))
         return query
 
+    def _queryParts(self):
+        # Everything the query of queryForSelect() depends on
+        ops = self.ops
+        return (self.sourceClass,
+                tuple(self.sourceClass.sqlmeta.columnList),
+                self.clause, self.tables,
+                ops.get('join', sqlbuilder.NoDefault),
+                ops.get('distinct', False), ops.get('lazyColumns', False),
+                ops.get('start', 0), ops.get('end', None),
+                ops.get('dbOrderBy', sqlbuilder.NoDefault),
+                ops.get('reversed', False), ops.get('forUpdate', False),
+                ops.get('valueColumns'))
+
     def __repr__(self):
         return "<%s at %x>" % (self.__class__.__name__, id(self))
 
@@ -106,6 +182,15 @@ class SelectResults(object):
     def lazyColumns(self, value):
         return self.clone(lazyColumns=value)
 
+    def batchSize(self, value):
+        return self.clone(batchSize=value)
+
+    def prefetch(self, *names):
+        return self.clone(prefetch=names)
+
+    def prefetchJoins(self, *names):
+        return self.clone(prefetchJoins=names)
+
     def reversed(self):
         return self.clone(reversed=not self.ops.get('reversed', False))
 
@@ -169,6 +254,11 @@ class SelectResults(object):
             return self.clone(start=start, end=end)
         else:
             if value < 0:
+                if not self.ops.get('start') and \
+                        self.ops.get('end') is None and self._uniqueOrder():
+                    # Counted from the end of the reversed order, which
+                    # only gives the same rows if the order is unique
+                    return self.reversed()[-value - 1]
                 return list(iter(self))[value]
             else:
                 start = self.ops.get('start', 0) + value
@@ -188,6 +278,274 @@ class SelectResults(object):
         conn = self._getConnection()
         return conn.iterSelect(self)
 
+    def update(self, **values):
+        """
+        Sets the columns in `values` in every row of the results with
+        one UPDATE; see SQLObject.updateMany().
+        """
+        cls = self.sourceClass
+        ops = self.ops
+        conn = self._getConnection()
+        if ops.get('start') or ops.get('end') is not None or \
+                ops.get('join') or ops.get('distinct') or \
+                [t for t in self.tables if t != cls.sqlmeta.table]:
+            # UPDATE can't slice or join: update the rows by id
+            ids = [id for (id,) in conn.queryAll(*conn._bindSQL(
+                conn.sqlrepr, self.queryForSelect().newItems([cls.q.id])))]
+            cls._SO_updateMany(conn, values, ids=ids)
+        else:
+            cls._SO_updateMany(conn, values, where=self.clause)
+
+    def stream(self, batchSize=None):
+        """
+        Like lazyIter(), but for results too big for memory: the rows
+        are read from the server ``batchSize`` at a time, with a
+        server-side cursor where the backend has one (PostgreSQL with
+        psycopg2, MySQL), on a connection kept until the iteration ends.
+        Call .close() on the iterator (or use it in a ``with``
+        statement) to release the connection earlier.
+        """
+        select = self
+        if batchSize:
+            select = self.clone(batchSize=batchSize)
+        conn = select._getConnection()
+        return conn.streamSelect(select)
+
+    def pageAfter(self, last, size):
+        """
+        The `size` results that follow `last` in the order of the
+        results, found with a WHERE clause on the ordering columns
+        (keyset pagination) rather than with an OFFSET, so deep pages
+        cost as much as the first one.  `last` is the last instance of
+        the previous page, the tuple of its values of the ordering
+        columns, or None for the first page.  The id is added to the
+        order to make it unique; the ordering columns should not be
+        NULL.
+        """
+        if self.ops.get('start') or self.ops.get('end') is not None:
+            raise ValueError("Sliced results can't be paged by key")
+        keys = self._pageKeys()
+        results = self.clone(orderBy=[desc and sqlbuilder.DESC(key) or key
+                                      for key, desc in keys])
+        if last is not None:
+            results = results.filter(self._pageClause(keys, last))
+        return results[:size]
+
+    def chunked(self, size):
+        """
+        Iterates over the results as lists of up to `size` instances,
+        each fetched with pageAfter() the last one.
+        """
+        last = None
+        while True:
+            page = list(self.pageAfter(last, size))
+            if page:
+                yield page
+            if len(page) < size:
+                break
+            last = page[-1]
+
+    def _pageKeys(self):
+        # [(column field, descending)] of the order of the results, made
+        # unique with the id
+        keys = self._orderKeys()
+        for key, desc in keys:
+            if key.original == 'id':
+                break
+        else:
+            keys.append((self.sourceClass.q.id, False))
+        return keys
+
+    def _orderKeys(self):
+        # [(column field, descending)] of the order of the results
+        cls = self.sourceClass
+        orderBy = self.ops.get('dbOrderBy')
+        if orderBy is None or orderBy is sqlbuilder.NoDefault:
+            orderBy = []
+        elif not isinstance(orderBy, (list, tuple)):
+            orderBy = [orderBy]
+        keys = []
+        for item in orderBy:
+            desc = False
+            while isinstance(item, sqlbuilder.DESC):
+                item = item.expr
+                desc = not desc
+            if isinstance(item, sqlbuilder.SQLConstant) and \
+                    item.const in ('id', cls.sqlmeta.idName):
+                item = cls.q.id
+            if not isinstance(item, sqlbuilder.SQLObjectField) or \
+                    not issubclass(cls, item.soClass):
+                raise ValueError("Can't page by key on %s: only the "
+                                 "columns of %s can be used"
+                                 % (item, cls.__name__))
+            keys.append((item, desc))
+        return keys
+
+    def _uniqueOrder(self):
+        # Does the order of the results tell all the rows apart, with
+        # the id or a unique NOT NULL column?
+        try:
+            keys = self._orderKeys()
+        except ValueError:
+            return False
+        for key, desc in keys:
+            if key.original == 'id':
+                return True
+            column = key.soClass.sqlmeta.columns.get(key.original)
+            if column is not None and column.unique and column.notNone:
+                return True
+        return False
+
+    def _pageClause(self, keys, last):
+        if isinstance(last, main.SQLObject):
+            values = [getattr(last, key.original) for key, desc in keys]
+        elif isinstance(last, (list, tuple)):
+            values = list(last)
+        else:
+            values = [last]
+        if len(values) != len(keys):
+            raise ValueError("The key of pageAfter() needs the values of %s"
+                             % ', '.join([key.original for key, desc in keys]))
+        if None in values:
+            raise ValueError("Can't page after a NULL key: %r" % (last,))
+        reverse = self.ops.get('reversed', False)
+        # (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..., with < for the
+        # columns in descending order
+        clauses = []
+        equal = []
+        for (key, desc), value in zip(keys, values):
+            value = key._from_python(value)
+            if desc != reverse:
+                after = sqlbuilder.SQLOp('<', key, value)
+            else:
+                after = sqlbuilder.SQLOp('>', key, value)
+            clauses.append(sqlbuilder.AND(*(equal + [after])))
+            equal.append(sqlbuilder.SQLOp('=', key, value))
+        return sqlbuilder.OR(*clauses)
+
+    def tuples(self, *names):
+        """
+        Iterates over the rows as tuples of the values of the columns
+        `names` (default: ``'id'`` and every column), converted by the
+        columns but without making instances or touching the cache.
+        """
+        return self._iterValues(names, tuple)
+
+    def dicts(self, *names):
+        """
+        Like tuples(), but iterates over dictionaries keyed by the
+        names.
+        """
+        names = names or self._valueNames()
+        return self._iterValues(names, lambda row: dict(zip(names, row)))
+
+    def values(self, *names):
+        """
+        Like tuples(); with one name, iterates over the values of that
+        column rather than over tuples of one value.
+        """
+        if len(names) == 1:
+            return self._iterValues(names, operator.itemgetter(0))
+        return self._iterValues(names, tuple)
+
+    def _valueNames(self):
+        return ['id'] + [column.name
+                         for column in self.sourceClass.sqlmeta.columnList]
+
+    def _valueColumns(self, names):
+        # The columns of names (None for the id)
+        cls = self.sourceClass
+        columns = cls.sqlmeta.columns
+        valueColumns = []
+        for name in names or self._valueNames():
+            if name == 'id':
+                valueColumns.append(None)
+                continue
+            column = columns.get(name) or columns.get(name + 'ID')
+            if column is None:
+                raise AttributeError("%s has no column %r"
+                                     % (cls.__name__, name))
+            valueColumns.append(column)
+        return valueColumns
+
+    def _valueRows(self, columns, makeRow):
+        select = self.clone(valueColumns=tuple([column and column.name
+                                                or 'id'
+                                                for column in columns]),
+                            makeRow=makeRow, lazyColumns=False)
+        return select.lazyIter()
+
+    def _iterValues(self, names, makeValue):
+        columns = self._valueColumns(names)
+        converters = [(index, column.to_python)
+                      for index, column in enumerate(columns)
+                      if column is not None and column.to_python]
+        state = sqlbuilder.SQLObjectState(self.sourceClass,
+                                          connection=self._getConnection())
+        def makeRow(row):
+            if converters:
+                row = list(row)
+                for index, to_python in converters:
+                    row[index] = to_python(row[index], state)
+            return makeValue(row)
+        return self._valueRows(columns, makeRow)
+
+    def toColumns(self, names, format='numpy'):
+        """
+        Returns the values of the columns `names` as a list of arrays,
+        one per name: NumPy arrays with format='numpy' (array.array if
+        NumPy is not installed), array.array with format='array'.
+
+        Ids and integer, boolean, float and decimal columns fill typed
+        arrays a batch of rows at a time, without making objects for
+        their values; a NULL is NaN in a float or decimal column and a
+        ValueError in the others.  Other columns need NumPy and give
+        object arrays of the values converted by the columns.
+        """
+        if format not in ('numpy', 'array'):
+            raise ValueError("Unknown format %r" % format)
+        useNumpy = format == 'numpy' and numpy is not None
+        columns = self._valueColumns(names)
+        arrays = []
+        for name, column in zip(names, columns):
+            typecode = _arrayTypecode(self.sourceClass, column)
+            if typecode is not None:
+                arrays.append(array.array(typecode))
+            elif useNumpy:
+                arrays.append([])
+            else:
+                raise TypeError("The values of %s.%s can't be put in an "
+                                "array.array" % (self.sourceClass.__name__,
+                                                 name))
+        conn = self._getConnection()
+        state = sqlbuilder.SQLObjectState(self.sourceClass, connection=conn)
+        batchSize = self.ops.get('batchSize') or conn.batchSize
+        # The rows as the driver returns them
+        rows = self._valueRows(columns, tuple)
+        while True:
+            batch = list(itertools.islice(rows, batchSize))
+            if not batch:
+                break
+            for name, column, result, values in zip(names, columns, arrays,
+                                                    zip(*batch)):
+                if isinstance(result, list):
+                    if column is not None and column.to_python:
+                        values = [column.to_python(value, state)
+                                  for value in values]
+                    result.extend(values)
+                    continue
+                size = len(result)
+                try:
+                    result.extend(values)
+                except TypeError:
+                    # NULLs, or numbers of other types (Decimal)
+                    del result[size:]
+                    result.extend(_coerceValues(name, result.typecode,
+                                                values))
+        if useNumpy:
+            arrays = [_numpyArray(values) for values in arrays]
+        return arrays
+
     def accumulate(self, *expressions):
         """ Use accumulate expression(s) to select result
             using another SQL select through current
@@ -4,6 +4,7 @@ from sqlobject import col
 class SybaseConnection(DBAPI):
 
     supportTransactions = False
+    multiRowInsert = False
     dbName = 'sybase'
     schemes = [dbName]
     NumericType = None
@@ -0,0 +1,85 @@
+from sqlobject import *
+from sqlobject.converters import sqlrepr
+from sqlobject.dbconnection import StatementTemplate, valueSlot
+from sqlobject.tests.dbtest import *
+
+########################################
+## Bound parameters
+########################################
+
+class TestBound(SQLObject):
+    name = StringCol(alternateID=True, length=50)
+    value = IntCol(default=None)
+    others = RelatedJoin('TestBoundOther')
+
+class TestBoundOther(SQLObject):
+    name = StringCol()
+    bounds = RelatedJoin('TestBound')
+
+def test_bind_parameters():
+    conn = getConnection(bindParameters=1)
+    for cls in (TestBound, TestBoundOther):
+        cls.dropTable(ifExists=True, connection=conn)
+        cls.createTable(connection=conn)
+    sql, params = conn._bindSQL(conn.sqlrepr, TestBound.q.name == "it's")
+    assert "it's" not in sql
+    assert params == ["it's"]
+    names = ["it's", '50%', 'back\\slash', 'under_score']
+    for name in names:
+        TestBound(name=name, value=len(name), connection=conn)
+    conn.cache.clear()
+    for name in names:
+        obj = TestBound.byName(name, connection=conn)
+        assert obj.name == name
+        assert obj.value == len(name)
+    assert TestBound.selectBy(name="it's", connection=conn).count() == 1
+    assert TestBound.select(TestBound.q.name.startswith('50%'),
+                            connection=conn).count() == 1
+    assert TestBound.select(TestBound.q.name.contains('_'),
+                            connection=conn).count() == 1
+    obj = TestBound.byName('50%', connection=conn)
+    obj.name = "%s's"
+    obj.value = None
+    other = TestBoundOther(name="o'ther", connection=conn)
+    obj.addTestBoundOther(other)
+    conn.cache.clear()
+    obj = TestBound.byName("%s's", connection=conn)
+    assert obj.value is None
+    assert list(obj.others) == [other]
+    obj.removeTestBoundOther(other)
+    assert list(obj.others) == []
+    TestBound.deleteBy(name="it's", connection=conn)
+    assert TestBound.select(connection=conn).count() == 3
+
+class StatementConnection(object):
+    bindParameters = True
+    paramstyle = 'format'
+    def sqlrepr(self, value):
+        return sqlrepr(value, 'mysql')
+
+def test_statement_template():
+    conn = StatementConnection()
+    statement = StatementTemplate(
+        "UPDATE t SET a = (%s), b = (%s) WHERE c LIKE '%%' AND id = (%s)"
+        % (valueSlot, valueSlot, valueSlot))
+    assert statement.render(conn, ['x', None, 1]) == \
+        ("UPDATE t SET a = (%s), b = (NULL) WHERE c LIKE '%%' AND id = (%s)",
+         ['x', 1])
+    conn.bindParameters = False
+    assert statement.render(conn, ['x', None, 1]) == \
+        ("UPDATE t SET a = ('x'), b = (NULL) WHERE c LIKE '%' AND id = (1)",
+         None)
+
+def test_statement_cache():
+    conn = getConnection()
+    TestBound.dropTable(ifExists=True, connection=conn)
+    TestBound.createTable(connection=conn)
+    obj = TestBound(name='one', connection=conn)
+    obj.value = 1
+    obj.value = 2
+    TestBound(name='two', connection=conn).value = 3
+    updates = [key for key in conn._statementCache
+               if key[:2] == ('update', TestBound)]
+    assert updates == [('update', TestBound, ('value',))]
+    obj.expire()
+    assert obj.value == 2
@@ -1,6 +1,10 @@
+import os
+import shutil
+import tempfile
+import threading
 from sqlobject import *
 from dbtest import *
-from sqlobject.cache import CacheSet
+from sqlobject.cache import CacheSet, SharedFileRowCache
 
 class Something(object):
     pass
@@ -22,6 +26,34 @@ def test_purge1():
     assert j == None
     x.finishPut(y.__class__)
 
+def test_concurrent_get():
+    x = CacheSet()
+    y = Something()
+    results = {}
+    def getter(id):
+        obj = x.get(id, Something)
+        if obj is None:
+            obj = Something()
+            x.put(id, Something, obj)
+            x.finishPut(Something, id)
+        results[id] = obj
+    assert x.get(1, Something) is None
+    # Loading another id is not blocked by the load of 1 in progress
+    other = threading.Thread(target=getter, args=(2,))
+    other.start()
+    other.join(5)
+    assert not other.isAlive()
+    assert 2 in results
+    # A second load of 1 waits for the first one and gets its object
+    same = threading.Thread(target=getter, args=(1,))
+    same.start()
+    same.join(0.1)
+    assert same.isAlive()
+    x.put(1, Something, y)
+    x.finishPut(Something, 1)
+    same.join(5)
+    assert results[1] is y
+
 
 class CacheTest(SQLObject):
     name = StringCol(alternateID=True, length=100)
@@ -49,3 +81,338 @@ def test_cache_cull():
     s = CacheTest(name='test_cache_create')
     list = [CacheTest(name='test_cache_create %d' % count) for count in range(s._connection.cache.caches['CacheTest'].cullFrequency)]
     assert len(s._connection.cache.caches['CacheTest'].cache) < s._connection.cache.caches['CacheTest'].cullFrequency
+
+def test_lru_entries():
+    x = CacheSet(policy='lru', maxEntries=3)
+    objs = [Something() for i in range(5)]
+    for i, obj in enumerate(objs[:3]):
+        assert x.get(i, Something) is None
+        x.put(i, Something, obj)
+        x.finishPut(Something)
+    # Touch the oldest entry so that 1 becomes the least recently used
+    assert x.get(0, Something) is objs[0]
+    x.created(3, Something, objs[3])
+    cache = x.caches['Something']
+    assert sorted(cache.cache.keys()) == [0, 2, 3]
+    # The evicted object is still alive, so it is found via the weakref
+    assert 1 in cache.expiredCache
+    assert x.get(1, Something) is objs[1]
+    assert sorted(cache.cache.keys()) == [0, 1, 3]
+
+def test_lru_bytes():
+    x = CacheSet(policy='lru', maxBytes=1)
+    obj = Something()
+    x.created(1, Something, obj)
+    cache = x.caches['Something']
+    assert not cache.cache
+    assert cache.policy.totalBytes == 0
+    assert x.tryGet(1, Something) is obj
+
+def test_incremental_cull():
+    x = CacheSet(cullFraction=2, cullBatch=10)
+    objs = [Something() for i in range(100)]
+    for i, obj in enumerate(objs):
+        assert x.get(i, Something) is None
+        x.put(i, Something, obj)
+        x.finishPut(Something, i)
+    cache = x.caches['Something']
+    cache.cull()
+    # only the first ten objects were looked at
+    assert len(cache.cache) == 95
+    assert sorted(cache.expiredCache) == [0, 2, 4, 6, 8]
+    cache.cull()
+    assert sorted(cache.expiredCache) == [0, 2, 4, 6, 8, 10, 12, 14, 16, 18]
+    # collected objects leave the weakref cache by themselves
+    del objs[:20]
+    assert sorted(cache.expiredCache) == []
+    assert len(cache.cache) == 90
+
+def test_cull_reloaded():
+    x = CacheSet(cullFraction=1, cullBatch=10)
+    objs = [Something() for i in range(3)]
+    for i, obj in enumerate(objs):
+        assert x.get(i, Something) is None
+        x.put(i, Something, obj)
+        x.finishPut(Something, i)
+    # Expire and reload 1, which leaves it in the cache again
+    x.expire(1, Something)
+    del objs[1]
+    assert x.get(1, Something) is None
+    obj = Something()
+    x.put(1, Something, obj)
+    x.finishPut(Something, 1)
+    cache = x.caches['Something']
+    assert len(cache.policy.queue) == 3
+    cache.cull()
+    assert not cache.cache
+    # The culled objects keep their identity
+    assert x.get(1, Something) is obj
+    assert x.get(0, Something) is objs[0]
+
+class CacheLRUTest(SQLObject):
+    name = StringCol(length=100)
+
+def test_lru_connection():
+    setupClass(CacheLRUTest)
+    conn = getConnection(cachePolicy='lru', cacheMaxEntries=5)
+    CacheLRUTest.createTable(ifNotExists=True, connection=conn)
+    assert conn.cache.kw['policy'] == 'lru'
+    assert conn.cache.kw['maxEntries'] == 5
+    ids = [CacheLRUTest(name='lru %d' % i, connection=conn).id
+           for i in range(10)]
+    cache = conn.cache.caches['CacheLRUTest']
+    assert len(cache.cache) == 5
+    assert CacheLRUTest.get(ids[0], connection=conn).name == 'lru 0'
+
+class CacheTTLTest(SQLObject):
+    class sqlmeta:
+        cacheTTL = 60
+    name = StringCol(length=100)
+
+def test_cache_ttl():
+    setupClass(CacheTTLTest)
+    s = CacheTTLTest(name='fresh')
+    conn = CacheTTLTest._connection
+    conn.query("UPDATE cache_ttl_test SET name = 'changed' WHERE id = %d"
+               % s.id)
+    assert CacheTTLTest.get(s.id) is s
+    assert s.name == 'fresh'
+    # Pretend the row was loaded a long time ago
+    s.sqlmeta.loadedAt -= 120
+    assert CacheTTLTest.get(s.id) is s
+    assert s.name == 'changed'
+    s.sqlmeta.loadedAt -= 120
+    conn.query("DELETE FROM cache_ttl_test WHERE id = %d" % s.id)
+    raises(SQLObjectNotFound, CacheTTLTest.get, s.id)
+    assert conn.cache.tryGet(s.id, CacheTTLTest) is None
+
+def test_cache_ttl_connection():
+    conn = getConnection(cacheTTL='2.5')
+    assert conn.cacheTTL == 2.5
+    assert getConnection().cacheTTL is None
+
+def test_cache_stats():
+    x = CacheSet(cullFrequency=2)
+    objs = [Something() for i in range(4)]
+    assert x.stats(Something) is None
+    for i, obj in enumerate(objs):
+        assert x.get(i, Something) is None
+        x.put(i, Something, obj)
+        x.finishPut(Something, i)
+    stats = x.stats()['Something']
+    assert stats['misses'] == 4
+    assert stats['culls'] == 1
+    assert stats['evictions'] == stats['weakSize'] == 2
+    assert stats['size'] == 2
+    for i in range(4):
+        assert x.get(i, Something) is objs[i]
+    stats = x.stats(Something)
+    assert stats['hits'] + stats['resurrections'] == 4
+    assert stats['resurrections'] >= 2
+    x.resetStats()
+    assert x.stats(Something)['hits'] == 0
+
+def test_shared_file_cache():
+    dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(dir, 'rows')
+        first = SharedFileRowCache(path, slots=16, slotSize=128)
+        second = SharedFileRowCache(path, slots=1, slotSize=1)
+        assert (second.slots, second.slotSize) == (16, 128)
+        row, version = first.lookup('A:1')
+        assert row is None
+        first.store('A:1', (1, u'one'), version)
+        assert second.lookup('A:1') == ((1, u'one'), version)
+        # a row loaded before the invalidation isn't stored
+        second.invalidate('A:1')
+        first.store('A:1', (1, u'old'), version)
+        row, newVersion = first.lookup('A:1')
+        assert row is None and newVersion != version
+        # rows that don't fit aren't stored
+        first.store('A:1', ('x' * 200,), newVersion)
+        assert second.lookup('A:1')[0] is None
+        first.close()
+        second.close()
+    finally:
+        shutil.rmtree(dir)
+
+def test_shared_file_cache_fork():
+    if not hasattr(os, 'fork'):
+        return
+    import fcntl
+    dir = tempfile.mkdtemp()
+    try:
+        cache = SharedFileRowCache(os.path.join(dir, 'rows'),
+                                   slots=16, slotSize=128)
+        locked, release = os.pipe(), os.pipe()
+        pid = os.fork()
+        if not pid:
+            try:
+                cache._acquire(fcntl.LOCK_EX)
+                os.write(locked[1], 'x')
+                os.read(release[0], 1)
+                cache._release()
+            finally:
+                os._exit(0)
+        try:
+            os.read(locked[0], 1)
+            # The child holds the lock, which the parent can't share
+            raises(IOError, cache._acquire,
+                   fcntl.LOCK_EX | fcntl.LOCK_NB)
+        finally:
+            os.write(release[1], 'x')
+            os.waitpid(pid, 0)
+        cache._acquire(fcntl.LOCK_EX | fcntl.LOCK_NB)
+        cache._release()
+        cache.close()
+    finally:
+        shutil.rmtree(dir)
+
+class CacheSharedTest(SQLObject):
+    name = StringCol(length=100)
+
+def test_shared_connection():
+    setupClass(CacheSharedTest)
+    dir = tempfile.mkdtemp()
+    try:
+        conn = getConnection(sharedCache='shm',
+                             sharedCachePath=os.path.join(dir, 'rows'))
+        CacheSharedTest.createTable(ifNotExists=True, connection=conn)
+        s = CacheSharedTest(name='first', connection=conn)
+        id = s.id
+        assert CacheSharedTest.get(id, connection=conn) is s
+        conn.cache.clear()
+        assert CacheSharedTest.get(id, connection=conn).name == 'first'
+        # Served from the shared cache, so this change goes unnoticed
+        conn.query("UPDATE cache_shared_test SET name = 'second' "
+                   "WHERE id = %d" % id)
+        conn.cache.clear()
+        s = CacheSharedTest.get(id, connection=conn)
+        assert s.name == 'first'
+        s.name = 'third'
+        conn.cache.clear()
+        assert CacheSharedTest.get(id, connection=conn).name == 'third'
+        trans = conn.transaction()
+        CacheSharedTest.get(id, connection=trans).name = 'fourth'
+        trans.commit(close=True)
+        conn.cache.clear()
+        assert CacheSharedTest.get(id, connection=conn).name == 'fourth'
+        CacheSharedTest.get(id, connection=conn).destroySelf()
+        conn.cache.clear()
+        raises(SQLObjectNotFound, CacheSharedTest.get, id, connection=conn)
+        conn.cache.shared.close()
+    finally:
+        shutil.rmtree(dir)
+
+def test_shared_delete_many():
+    setupClass(CacheSharedTest)
+    dir = tempfile.mkdtemp()
+    try:
+        conn = getConnection(sharedCache='shm',
+                             sharedCachePath=os.path.join(dir, 'rows'))
+        CacheSharedTest.createTable(ifNotExists=True, connection=conn)
+        ids = [CacheSharedTest(name=name, connection=conn).id
+               for name in ('x', 'y')]
+        for id in ids:
+            CacheSharedTest.get(id, connection=conn).name
+        conn.cache.clear()
+        CacheSharedTest.deleteMany(CacheSharedTest.q.id == ids[0],
+                                   connection=conn)
+        CacheSharedTest.deleteBy(name='y', connection=conn)
+        conn.cache.clear()
+        assert CacheSharedTest.select(connection=conn).count() == 0
+        for id in ids:
+            raises(SQLObjectNotFound, CacheSharedTest.get, id,
+                   connection=conn)
+        conn.cache.shared.close()
+    finally:
+        shutil.rmtree(dir)
+
+class CacheKeyTest(SQLObject):
+    class sqlmeta:
+        registry = 'cacheKeyFirst'
+    name = StringCol(length=100)
+
+def test_shared_key():
+    class CacheKeyTest(SQLObject):
+        class sqlmeta:
+            registry = 'cacheKeySecond'
+        name = StringCol(length=100)
+        age = IntCol()
+    first = globals()['CacheKeyTest']
+    dir = tempfile.mkdtemp()
+    try:
+        x = CacheSet(shared=SharedFileRowCache(os.path.join(dir, 'rows')))
+        row, version = x.lookupRow(1, first)
+        x.storeRow(1, first, ('a',), version)
+        assert x.lookupRow(1, first)[0] == ('a',)
+        # Same class name and table, another layout
+        assert x.lookupRow(1, CacheKeyTest)[0] is None
+        assert x._sharedKey(1, first).startswith('cache_key_test:')
+        x.shared.close()
+    finally:
+        shutil.rmtree(dir)
+
+def test_negative_cache():
+    x = CacheSet(negativeTTL=60, negativeMaxEntries=3)
+    assert not x.isMissing(1, Something)
+    x.addMissing(1, Something)
+    assert x.isMissing(1, Something)
+    x.removeMissing(1, Something)
+    assert not x.isMissing(1, Something)
+    for i in range(10):
+        x.addMissing(i, Something)
+    assert len(x.missing['Something']) == 3
+    assert x.isMissing(9, Something)
+    x.missing['Something'][9] -= 120
+    assert not x.isMissing(9, Something)
+    assert not x.isMissing([], Something)
+    assert not CacheSet().isMissing(9, Something)
+
+class CacheNegativeTest(SQLObject):
+    name = StringCol(length=100, alternateID=True)
+
+def test_negative_connection():
+    setupClass(CacheNegativeTest)
+    conn = getConnection(cacheNegativeTTL=60)
+    CacheNegativeTest.createTable(ifNotExists=True, connection=conn)
+    raises(SQLObjectNotFound, CacheNegativeTest.get, 1, connection=conn)
+    raises(SQLObjectNotFound, CacheNegativeTest.byName, 'a', connection=conn)
+    # Rows inserted behind SQLObject's back go unnoticed...
+    conn.query("INSERT INTO cache_negative_test (id, name) VALUES (1, 'a')")
+    raises(SQLObjectNotFound, CacheNegativeTest.get, 1, connection=conn)
+    raises(SQLObjectNotFound, CacheNegativeTest.byName, 'a', connection=conn)
+    conn.query("DELETE FROM cache_negative_test")
+    # ...but not the ones it creates
+    s = CacheNegativeTest(id=1, name='a', connection=conn)
+    assert CacheNegativeTest.get(1, connection=conn) is s
+    assert CacheNegativeTest.byName('a', connection=conn) is s
+    raises(SQLObjectNotFound, CacheNegativeTest.byName, 'b', connection=conn)
+    s.name = 'b'
+    assert CacheNegativeTest.byName('b', connection=conn) is s
+
+class CacheAlternateTest(SQLObject):
+    name = StringCol(length=100, alternateID=True)
+    first = StringCol(length=100)
+    last = StringCol(length=100)
+    fullName = DatabaseIndex(first, last, unique=True)
+
+def test_alternate_cache():
+    setupClass(CacheAlternateTest)
+    s = CacheAlternateTest(name='a', first='John', last='Cleese')
+    # Found in the cache: the database is not asked
+    CacheAlternateTest._connection.query(
+        "UPDATE cache_alternate_test SET name = 'x', first = 'x'")
+    assert CacheAlternateTest.byName('a') is s
+    assert CacheAlternateTest.fullName.get('John', 'Cleese') is s
+    assert CacheAlternateTest.fullName.get(first='John', last='Cleese') is s
+    s.set(name='b', first='Terry')
+    assert CacheAlternateTest.byName('b') is s
+    assert CacheAlternateTest.fullName.get('Terry', 'Cleese') is s
+    raises(SQLObjectNotFound, CacheAlternateTest.byName, 'a')
+    raises(SQLObjectNotFound, CacheAlternateTest.fullName.get,
+           'John', 'Cleese')
+    s.destroySelf()
+    raises(SQLObjectNotFound, CacheAlternateTest.byName, 'b')
+    raises(SQLObjectNotFound, CacheAlternateTest.fullName.get,
+           'Terry', 'Cleese')
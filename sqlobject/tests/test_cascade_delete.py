@@ -0,0 +1,106 @@
+from sqlobject import *
+from sqlobject import events
+from sqlobject.main import _SO_bulkNull
+from sqlobject.tests.dbtest import *
+
+########################################
+## Set-based cascades of destroySelf()
+########################################
+
+class CascadeAuthor(SQLObject):
+    name = StringCol(length=20)
+    tags = RelatedJoin('CascadeTag')
+
+class CascadeBook(SQLObject):
+    title = StringCol(length=20)
+    author = ForeignKey('CascadeAuthor', cascade=True)
+    editor = ForeignKey('CascadeAuthor', default=None, cascade='null')
+
+class CascadePage(SQLObject):
+    class sqlmeta:
+        cascadeSignals = False
+    number = IntCol()
+    book = ForeignKey('CascadeBook', cascade=True)
+    previous = ForeignKey('CascadePage', default=None, cascade=True)
+
+class CascadeTag(SQLObject):
+    name = StringCol(length=20)
+    authors = RelatedJoin('CascadeAuthor')
+
+class CascadeReview(SQLObject):
+    book = ForeignKey('CascadeBook', cascade=False)
+
+class CascadeNote(SQLObject):
+    book = ForeignKey('CascadeBook', cascade=True)
+    destroyed = []
+    def destroySelf(self):
+        self.destroyed.append(self.id)
+        super(CascadeNote, self).destroySelf()
+
+def test_cascade_delete():
+    setupClass([CascadeAuthor, CascadeTag, CascadeBook, CascadePage,
+                CascadeReview, CascadeNote])
+    writer = CascadeAuthor(name='writer')
+    editor = CascadeAuthor(name='editor')
+    tag = CascadeTag(name='novel')
+    writer.addCascadeTag(tag)
+    books = [CascadeBook(title=str(i), author=writer, editor=editor)
+             for i in range(3)]
+    edited = CascadeBook(title='other', author=editor, editor=writer)
+    previous = None
+    for i in range(5):
+        previous = CascadePage(number=i, book=books[0], previous=previous)
+    CascadePage(number=0, book=edited)
+    page = CascadePage.select(CascadePage.q.number == 4).getOne()
+    note = CascadeNote(book=books[2])
+
+    destroyed = []
+    def listener(instance, post_funcs):
+        destroyed.append(instance.__class__.__name__)
+    events.listen(listener, CascadeBook, events.RowDestroySignal)
+    events.listen(listener, CascadePage, events.RowDestroySignal)
+
+    review = CascadeReview(book=books[1])
+    raises(SQLObjectIntegrityError, writer.destroySelf)
+    # Nothing was deleted
+    assert CascadeBook.select().count() == 4
+    assert CascadePage.select().count() == 6
+    assert destroyed == []
+    review.destroySelf()
+
+    writer.destroySelf()
+    assert destroyed == ['CascadeBook'] * 3
+    assert [b.title for b in CascadeBook.select()] == ['other']
+    assert edited.editor is None
+    assert [p.book for p in CascadePage.select()] == [edited]
+    assert page.sqlmeta._obsolete
+    raises(SQLObjectNotFound, CascadePage.get, page.id)
+    # Classes that override destroySelf() have it called
+    assert CascadeNote.destroyed == [note.id]
+    assert tag.authors == []
+    assert editor.tags == []
+
+def test_cascade_null():
+    setupClass([CascadeAuthor, CascadeTag, CascadeBook, CascadePage,
+                CascadeReview, CascadeNote])
+    writer = CascadeAuthor(name='writer')
+    editors = [CascadeAuthor(name='editor %d' % i) for i in range(2)]
+    books = [CascadeBook(title=str(i), author=writer, editor=editors[0])
+             for i in range(2)]
+    editor = CascadeBook.sqlmeta.columns['editorID']
+    # Nobody listens: the books are updated together
+    assert _SO_bulkNull(CascadeBook, editor)
+    editors[0].destroySelf()
+    assert [b.editor for b in books] == [None, None]
+
+    updated = []
+    def listener(instance, kwargs):
+        updated.append(instance.id)
+    events.listen(listener, CascadeBook, events.RowUpdateSignal)
+    assert not _SO_bulkNull(CascadeBook, editor)
+    for book in books:
+        book.editor = editors[1]
+    del updated[:]
+    editors[1].destroySelf()
+    assert sorted(updated) == sorted([b.id for b in books])
+    assert [b.editor for b in books] == [None, None]
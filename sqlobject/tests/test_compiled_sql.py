@@ -0,0 +1,76 @@
+from sqlobject import *
+from sqlobject.sqlbuilder import AND, IN, compileShape
+from sqlobject.tests.dbtest import *
+
+########################################
+## Compiled SQL of selects
+########################################
+
+class CompiledPerson(SQLObject):
+    name = StringCol(length=50)
+    age = IntCol(default=None)
+
+def setupCompiled():
+    setupClass(CompiledPerson)
+    CompiledPerson.createMany([dict(name=name, age=i)
+                               for i, name in enumerate('abcde')])
+    CompiledPerson(name='f')
+    conn = CompiledPerson._connection
+    conn._compiledCache.clear()
+    return conn
+
+def names(results):
+    return [p.name for p in results]
+
+def test_compiled_values():
+    conn = setupCompiled()
+    for age, expected in [(1, 'cde'), (3, 'e'), (2, 'de')]:
+        results = CompiledPerson.select(CompiledPerson.q.age > age,
+                                        orderBy='name')
+        assert ''.join(names(results)) == expected
+        assert results.count() == len(expected)
+    # One shape for the selects and one for the counts
+    assert len(conn._compiledCache) == 2
+    assert None not in conn._compiledCache.values()
+
+def test_compiled_slices():
+    setupCompiled()
+    for start in range(4):
+        results = CompiledPerson.select(orderBy='name')[start:start+2]
+        assert names(results) == list('abcdef'[start:start+2])
+
+def test_compiled_null_like():
+    setupCompiled()
+    assert names(CompiledPerson.select(CompiledPerson.q.age == None)) == \
+        ['f']
+    assert names(CompiledPerson.select(CompiledPerson.q.age == 2)) == ['c']
+    assert names(CompiledPerson.select(
+        CompiledPerson.q.name.startswith('e'))) == ['e']
+    assert names(CompiledPerson.select(
+        CompiledPerson.q.name.startswith('a'))) == ['a']
+    assert names(CompiledPerson.select("age = 1")) == ['b']
+    assert names(CompiledPerson.select("age = 4")) == ['e']
+    assert names(CompiledPerson.select(
+        IN(CompiledPerson.q.age, [0, 4]), orderBy='age')) == ['a', 'e']
+    assert names(CompiledPerson.select(
+        IN(CompiledPerson.q.age, [1]))) == ['b']
+
+def test_compiled_uncachable():
+    conn = setupCompiled()
+    results = CompiledPerson.select(IN(CompiledPerson.q.age, set([1, 3])),
+                                    orderBy='age')
+    assert names(results) == ['b', 'd']
+    assert not conn._compiledCache
+
+def test_compile_shape():
+    values = []
+    first = compileShape(AND(CompiledPerson.q.age > 1,
+                             CompiledPerson.q.name == 'x'), values)
+    assert sorted(values) == [1, 'x']
+    second = compileShape(AND(CompiledPerson.q.age > 2,
+                              CompiledPerson.q.name == 'y'), values)
+    assert first == second
+    assert sorted(values) == [1, 2, 'x', 'y']
+    assert compileShape(CompiledPerson.q.age < 1, []) != \
+        compileShape(CompiledPerson.q.age > 1, [])
+    raises(TypeError, compileShape, set([1]), [])
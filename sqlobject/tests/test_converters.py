@@ -2,7 +2,7 @@ from datetime import timedelta
 import sys
 
 from sqlobject.converters import registerConverter, sqlrepr, \
-     quote_str, unquote_str
+     quote_str, unquote_str, bindParameters
 from sqlobject.sqlbuilder import SQLExpression, SQLObjectField, \
      Select, Insert, Update, Delete, Replace, \
      SQLTrueClauseClass, SQLConstant, SQLPrefix, SQLCall, SQLOp, \
@@ -210,3 +210,17 @@ def test_like_quoted():
     assert sqlrepr(_LikeQuoted('test'), 'sqlite') == "'test'"
     assert sqlrepr(_LikeQuoted('test%'), 'postgres') == r"E'test\\%'"
     assert sqlrepr(_LikeQuoted('test%'), 'sqlite') == r"'test\%'"
+
+def test_bind_parameters():
+    expr = SQLOp('AND', SQLOp('=', SQLConstant('a'), "it's"),
+                 SQLOp('<', SQLConstant('b'), 5))
+    assert bindParameters('qmark', sqlrepr, expr, 'sqlite') == \
+        ("(((a) = (?)) AND ((b) < (?)))", ["it's", 5])
+    assert bindParameters('format', sqlrepr, SQLOp('LIKE', 'x', 'a%'), 'mysql') == \
+        ("((%s) LIKE (%s))", ['x', 'a%'])
+    assert bindParameters('named', sqlrepr, SQLOp('<', 'x', 2.5), 'sqlite') == \
+        ("((:p1) < (:p2))", {'p1': 'x', 'p2': 2.5})
+    # Nothing to bind
+    assert bindParameters('qmark', sqlrepr, SQLOp('=', SQLConstant('a'), None), 'sqlite')[1] is None
+    assert bindParameters('numeric', sqlrepr, _LikeQuoted('a%') + '%', 'postgres') == \
+        (":1", ['a\\%%'])
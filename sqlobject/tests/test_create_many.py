@@ -0,0 +1,48 @@
+from sqlobject import *
+from sqlobject import events
+from sqlobject.tests.dbtest import *
+
+########################################
+## createMany
+########################################
+
+class CreateManyPerson(SQLObject):
+    name = StringCol(length=50, alternateID=True)
+    age = IntCol(default=None)
+    bool = BoolCol(default=False)
+
+class CreateManyAddress(SQLObject):
+    person = ForeignKey('CreateManyPerson')
+    city = UnicodeCol(length=50)
+
+def test_create_many():
+    setupClass([CreateManyPerson, CreateManyAddress])
+    assert CreateManyPerson.createMany(
+        [dict(name='a', age=1), dict(name='b'), dict(name='c', bool=True)],
+        batchSize=2) is None
+    people = list(CreateManyPerson.select(orderBy='name'))
+    assert [(p.name, p.age, p.bool) for p in people] == \
+        [('a', 1, False), ('b', None, False), ('c', None, True)]
+    addresses = CreateManyAddress.createMany(
+        [dict(person=people[0], city=u'Bras\xedlia'),
+         dict(personID=people[1].id, city=u'Paris')],
+        returnObjects=True)
+    assert [(a.person, a.city) for a in addresses] == \
+        [(people[0], u'Bras\xedlia'), (people[1], u'Paris')]
+    raises(TypeError, CreateManyAddress.createMany, [dict(city=u'Rome')])
+    raises(TypeError, CreateManyAddress.createMany,
+           [dict(person=people[0], city=u'Rome', country=u'Italy')])
+
+def test_create_many_no_refetch():
+    setupClass(CreateManyPerson)
+    created = []
+    def listener(instance, kwargs, post_funcs):
+        created.append(instance.name)
+    events.listen(listener, CreateManyPerson, events.RowCreatedSignal)
+    people = CreateManyPerson.createMany(
+        [dict(name='d', age=4), dict(id=100, name='e')],
+        returnObjects=True, refetch=False, signals=True)
+    assert created == ['d', 'e']
+    assert [(p.name, p.age) for p in people] == [('d', 4), ('e', None)]
+    assert people[1].id == 100
+    assert CreateManyPerson.byName('e') is people[1]
@@ -0,0 +1,79 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+########################################
+## Keyset pagination
+########################################
+
+class PageItem(SQLObject):
+    name = StringCol(length=50)
+    rank = IntCol()
+
+def setupPages():
+    setupClass(PageItem)
+    # Ranks repeat, so the id decides between equal ranks
+    PageItem.createMany([dict(name='item%02d' % i, rank=i % 4)
+                         for i in range(10)])
+
+def names(results):
+    return [item.name for item in results]
+
+def test_page_after():
+    setupPages()
+    results = PageItem.select(orderBy='name')
+    first = names(results.pageAfter(None, 3))
+    assert first == ['item00', 'item01', 'item02']
+    last = PageItem.selectBy(name='item02').getOne()
+    assert names(results.pageAfter(last, 3)) == \
+        ['item03', 'item04', 'item05']
+    last = PageItem.selectBy(name='item08').getOne()
+    assert names(results.pageAfter(('item08', last.id), 3)) == ['item09']
+    # The id only decides between equal names
+    assert names(results.pageAfter(('item08', 0), 3)) == \
+        ['item08', 'item09']
+
+def test_page_after_non_unique():
+    setupPages()
+    results = PageItem.select(orderBy=['-rank'])
+    expected = names(results.orderBy(['-rank', 'id']))
+    pages = list(results.chunked(3))
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert [name for page in pages for name in names(page)] == expected
+
+def test_page_after_reversed():
+    setupPages()
+    results = PageItem.select(PageItem.q.rank > 0, orderBy='name').reversed()
+    expected = names(results)
+    assert [name for page in results.chunked(4) for name in names(page)] \
+        == expected
+    assert expected[0] == 'item09'
+
+def test_page_after_errors():
+    setupPages()
+    results = PageItem.select(orderBy='name')
+    raises(ValueError, results[2:4].pageAfter, None, 2)
+    raises(ValueError, results.pageAfter, 'item03', 2)
+    raises(ValueError, PageItem.select(orderBy='LOWER(name)').pageAfter,
+           None, 2)
+    assert list(PageItem.select().chunked(5))[1][-1].name == 'item09'
+
+def test_negative_index():
+    setupPages()
+    results = PageItem.select(orderBy='name')
+    assert results[-1].name == 'item09'
+    assert results[-3].name == 'item07'
+    assert results.reversed()[-1].name == 'item00'
+    assert results[2:5][-1].name == 'item04'
+    raises(IndexError, results.__getitem__, -11)
+
+def test_negative_index_non_unique():
+    setupPages()
+    # The reversed order only gives the same rows if the order is unique
+    results = PageItem.select(orderBy='rank')
+    assert not results._uniqueOrder()
+    assert results[-1] == list(results)[-1]
+    assert results[-4] == list(results)[-4]
+    results = PageItem.select(orderBy=['rank', '-id'])
+    assert results._uniqueOrder()
+    assert names([results[-1], results[-2]]) == ['item03', 'item07']
+    assert not PageItem.select()._uniqueOrder()
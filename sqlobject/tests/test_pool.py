@@ -0,0 +1,173 @@
+import threading
+import time
+from py.test import raises
+from sqlobject.dbconnection import DBAPI
+from sqlobject.dberrors import PoolTimeoutError
+
+########################################
+## Connection pool
+########################################
+
+class FakeModule(object):
+    class Error(Exception):
+        pass
+    Binary = str
+
+class FakeConnection(object):
+    closed = False
+    def close(self):
+        self.closed = True
+    def commit(self):
+        pass
+    def rollback(self):
+        pass
+
+class FakeDBAPI(DBAPI):
+    module = FakeModule
+    supportTransactions = False
+    def makeConnection(self):
+        return FakeConnection()
+
+def test_pool_reuse():
+    pool = FakeDBAPI()
+    conn = pool.getConnection()
+    pool.releaseConnection(conn)
+    assert pool.getConnection() is conn
+    assert pool.getConnection() is not conn
+
+def test_pool_max_size():
+    pool = FakeDBAPI(poolMaxSize='2', poolTimeout='0.1')
+    conn1 = pool.getConnection()
+    conn2 = pool.getConnection()
+    raises(PoolTimeoutError, pool.getConnection)
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getConnection()))
+    pool.poolTimeout = 10
+    waiter.start()
+    time.sleep(0.05)
+    assert not got
+    pool.releaseConnection(conn1)
+    waiter.join()
+    assert got == [conn1]
+
+def test_pool_max_size_no_pool():
+    pool = FakeDBAPI(poolMaxSize=1, poolTimeout=0.1)
+    pool._pool = None
+    conn = pool.getConnection()
+    raises(PoolTimeoutError, pool.getConnection)
+    pool.releaseConnection(conn)
+    assert conn.closed
+    assert pool.getConnection() is not conn
+
+def test_pool_trim():
+    pool = FakeDBAPI(poolMinSize=2, poolMaxIdle=60)
+    conns = [pool.getConnection() for i in range(3)]
+    for conn in conns:
+        pool.releaseConnection(conn)
+    assert list(pool._pool) == conns
+    for conn in conns[:2]:
+        pool._poolReleased[id(conn)] -= 120
+    assert pool.getConnection() is conns[2]
+    # conns[1] is kept to have two connections open
+    assert list(pool._pool) == [conns[1]]
+    assert conns[0].closed and not conns[1].closed
+    assert pool._poolSize == 2
+
+class FakeCursor(object):
+    def __init__(self, conn):
+        self.conn = conn
+    def execute(self, query):
+        if self.conn.dead:
+            raise FakeModule.Error('server has gone away')
+    def fetchall(self):
+        return [(1,)]
+    def close(self):
+        pass
+
+class PingedConnection(FakeConnection):
+    dead = False
+    def cursor(self):
+        return FakeCursor(self)
+
+class PingedDBAPI(FakeDBAPI):
+    def makeConnection(self):
+        return PingedConnection()
+
+def test_pool_recycle():
+    pool = FakeDBAPI(poolRecycle=60)
+    conn = pool.getConnection()
+    pool.releaseConnection(conn)
+    pool._poolCreated[id(conn)] -= 120
+    newConn = pool.getConnection()
+    assert newConn is not conn and conn.closed
+    pool._poolCreated[id(newConn)] -= 120
+    pool.releaseConnection(newConn)
+    assert newConn.closed and not pool._pool
+    assert pool._poolSize == 0
+
+def test_pool_pre_ping():
+    pool = PingedDBAPI(poolPrePing='1', poolPrePingIdle=30)
+    conn = pool.getConnection()
+    pool.releaseConnection(conn)
+    conn.dead = True
+    # Not idle long enough to be pinged
+    assert pool.getConnection() is conn
+    pool.releaseConnection(conn)
+    pool._poolReleased[id(conn)] -= 60
+    newConn = pool.getConnection()
+    assert newConn is not conn and conn.closed
+    pool.releaseConnection(newConn)
+    pool._poolReleased[id(newConn)] -= 60
+    assert pool.getConnection() is newConn
+    assert pool._poolSize == 1
+
+class RolledBackConnection(PingedConnection):
+    rollbacks = 0
+    def rollback(self):
+        self.rollbacks += 1
+
+class TransactionalPingedDBAPI(FakeDBAPI):
+    supportTransactions = True
+    def makeConnection(self):
+        return RolledBackConnection()
+
+def test_pool_pre_ping_rollback():
+    pool = TransactionalPingedDBAPI(poolPrePing=True, poolPrePingIdle=30,
+                                    autoCommit=False)
+    conn = pool.getConnection()
+    pool.releaseConnection(conn)
+    rollbacks = conn.rollbacks
+    pool._poolReleased[id(conn)] -= 60
+    assert pool.getConnection() is conn
+    # The ping's implicit transaction was ended
+    assert conn.rollbacks == rollbacks + 1
+    pool.releaseConnection(conn)
+    conn.autocommit = True
+    rollbacks = conn.rollbacks
+    pool._poolReleased[id(conn)] -= 60
+    assert pool.getConnection() is conn
+    assert conn.rollbacks == rollbacks
+
+def test_pool_stats():
+    pool = FakeDBAPI(poolMaxSize=2, poolTimeout=0.05)
+    conn1 = pool.getConnection()
+    conn2 = pool.getConnection()
+    raises(PoolTimeoutError, pool.getConnection)
+    pool.releaseConnection(conn1)
+    # released twice
+    pool.releaseConnection(conn1)
+    stats = pool.poolStats()
+    assert stats['checkouts'] == 2
+    assert stats['created'] == 2
+    assert stats['timeouts'] == 1
+    assert stats['waitTime'] >= 0.05
+    assert stats['peakSize'] == stats['size'] == 2
+    assert stats['idle'] == 1
+    assert stats['inUse'] == 1
+    pool.resetPoolStats()
+    assert pool.getConnection() is conn1
+    pool.close()
+    stats = pool.poolStats()
+    assert stats['checkouts'] == 1
+    assert stats['created'] == 0
+    assert stats['inUse'] == 2
@@ -0,0 +1,170 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+########################################
+## Prefetching ForeignKeys
+########################################
+
+class PrefetchRegion(SQLObject):
+    name = StringCol(length=20)
+
+class PrefetchCustomer(SQLObject):
+    name = StringCol(length=20)
+    region = ForeignKey('PrefetchRegion', default=None)
+
+class PrefetchOrder(SQLObject):
+    number = IntCol()
+    customer = ForeignKey('PrefetchCustomer', default=None)
+
+def test_prefetch():
+    setupClass([PrefetchRegion, PrefetchCustomer, PrefetchOrder])
+    region = PrefetchRegion(name='north')
+    customers = [PrefetchCustomer(name=str(i), region=region)
+                 for i in range(3)]
+    for i in range(7):
+        PrefetchOrder(number=i, customer=customers[i % 3])
+    PrefetchOrder(number=7)
+    conn = PrefetchOrder._connection
+    conn.cache.clear()
+    orders = list(PrefetchOrder.select(orderBy='number', batchSize=5,
+                                       prefetch=['customer.region']))
+    for customer in customers:
+        assert conn.cache.tryGet(customer.id, PrefetchCustomer) is not None
+    assert conn.cache.tryGet(region.id, PrefetchRegion) is not None
+    assert [o.customer and o.customer.name for o in orders] == \
+        ['0', '1', '2', '0', '1', '2', '0', None]
+    assert orders[0].customer.region.name == 'north'
+
+    conn.cache.clear()
+    orders = list(PrefetchOrder.select().prefetch('customer'))
+    assert conn.cache.tryGet(customers[0].id, PrefetchCustomer) is not None
+    assert conn.cache.tryGet(region.id, PrefetchRegion) is None
+    raises(AttributeError, list, PrefetchOrder.select(prefetch=['number']))
+
+def test_prefetch_uncached():
+    setupClass([PrefetchRegion, PrefetchCustomer, PrefetchOrder])
+    conn = getConnection(cache=False)
+    for klass in PrefetchRegion, PrefetchCustomer, PrefetchOrder:
+        klass.createTable(ifNotExists=True, connection=conn)
+    region = PrefetchRegion(name='north', connection=conn)
+    customer = PrefetchCustomer(name='0', region=region, connection=conn)
+    PrefetchOrder(number=0, customer=customer, connection=conn)
+    regionID, customerID = region.id, customer.id
+    del region, customer
+    queries = []
+    def printDebug(rawconn, s, name, type='query'):
+        if type == 'query':
+            queries.append(s)
+    conn.debug = True
+    conn.printDebug = printDebug
+    for order in PrefetchOrder.select(prefetch=['customer.region'],
+                                      connection=conn):
+        # The prefetched instances are kept for the batch
+        assert conn.cache.tryGet(customerID, PrefetchCustomer) is not None
+        assert conn.cache.tryGet(regionID, PrefetchRegion) is not None
+        count = len(queries)
+        assert order.customer.region.name == 'north'
+        assert len(queries) == count
+
+def test_prefetch_cached_path():
+    setupClass([PrefetchRegion, PrefetchCustomer, PrefetchOrder])
+    region = PrefetchRegion(name='north')
+    customer = PrefetchCustomer(name='0', region=region)
+    PrefetchOrder(number=0, customer=customer)
+    conn = PrefetchOrder._connection
+    conn.cache.clear()
+    list(PrefetchOrder.select(prefetch=['customer']))
+    # The customer is cached: only its region is selected
+    selects = []
+    def select(*args, **kw):
+        selects.append(args)
+        return originalSelect(*args, **kw)
+    originalSelect = PrefetchCustomer.select
+    PrefetchCustomer.select = staticmethod(select)
+    try:
+        orders = list(PrefetchOrder.select(prefetch=['customer.region']))
+    finally:
+        del PrefetchCustomer.select
+    assert not selects
+    assert conn.cache.tryGet(region.id, PrefetchRegion) is not None
+    assert orders[0].customer.region.name == 'north'
+
+########################################
+## Prefetching joins
+########################################
+
+class PrefetchPerson(SQLObject):
+    name = StringCol(length=20)
+    addresses = MultipleJoin('PrefetchAddress', joinColumn='owner_id',
+                             orderBy='street')
+    tags = RelatedJoin('PrefetchTag')
+    notes = SQLMultipleJoin('PrefetchAddress', joinColumn='owner_id')
+
+class PrefetchAddress(SQLObject):
+    street = StringCol(length=20)
+    owner = ForeignKey('PrefetchPerson')
+
+class PrefetchTag(SQLObject):
+    name = StringCol(length=20)
+    people = RelatedJoin('PrefetchPerson')
+
+def test_prefetch_joins():
+    setupClass([PrefetchPerson, PrefetchAddress, PrefetchTag])
+    people = [PrefetchPerson(name=str(i)) for i in range(3)]
+    for street in 'cab':
+        PrefetchAddress(street=street, owner=people[0])
+    PrefetchAddress(street='d', owner=people[1])
+    tags = [PrefetchTag(name=str(i)) for i in range(2)]
+    people[0].addPrefetchTag(tags[0])
+    people[0].addPrefetchTag(tags[1])
+    people[2].addPrefetchTag(tags[1])
+    conn = PrefetchPerson._connection
+    conn.cache.clear()
+    people = list(PrefetchPerson.select(orderBy='name',
+                                        prefetchJoins=['addresses', 'tags']))
+    for person in people:
+        prefetched = person.sqlmeta._prefetchedJoins
+        assert sorted(prefetched.keys()) == ['addresses', 'tags']
+    assert [a.street for a in people[0].addresses] == ['a', 'b', 'c']
+    assert [a.street for a in people[1].addresses] == ['d']
+    assert people[2].addresses == []
+    assert sorted([t.name for t in people[0].tags]) == ['0', '1']
+    assert people[1].tags == []
+    assert [t.name for t in people[2].tags] == ['1']
+    # The prefetched lists are forgotten when the join changes
+    people[1].addPrefetchTag(tags[0])
+    assert people[1].tags == [tags[0]]
+    people[2].expire()
+    assert people[2].sqlmeta._prefetchedJoins is None
+    raises(ValueError, list, PrefetchPerson.select(prefetchJoins=['notes']))
+    raises(AttributeError, list, PrefetchPerson.select().prefetchJoins('x'))
+
+def test_prefetch_joins_changes():
+    setupClass([PrefetchPerson, PrefetchAddress, PrefetchTag])
+    people = [PrefetchPerson(name=str(i)) for i in range(2)]
+    PrefetchAddress(street='a', owner=people[0])
+    def select():
+        return list(PrefetchPerson.select(orderBy='name',
+                                          prefetchJoins=['addresses']))
+    # New rows of the joined class
+    first, second = select()
+    PrefetchAddress(street='b', owner=first)
+    assert [a.street for a in first.addresses] == ['a', 'b']
+    assert second.addresses == []
+    # Deleted rows
+    first, second = select()
+    first.addresses[0].destroySelf()
+    assert [a.street for a in first.addresses] == ['b']
+    # Rows given another foreign key
+    first, second = select()
+    first.addresses[0].owner = second
+    assert first.addresses == []
+    assert [a.street for a in second.addresses] == ['b']
+    first, second = select()
+    PrefetchAddress.updateMany(None, owner=first)
+    assert [a.street for a in first.addresses] == ['b']
+    # Other changes keep the lists
+    first, second = select()
+    first.addresses[0].street = 'c'
+    assert first.sqlmeta._prefetchedJoins['addresses'][0] == \
+        first.addresses
@@ -1,3 +1,4 @@
+import py
 from sqlobject import *
 from sqlobject.sqlbuilder import func
 from sqlobject.main import SQLObjectIntegrityError
@@ -40,6 +41,28 @@ def test_02_generator():
         count += 1
     assert count == len(names)
 
+def test_02b_batches():
+    setupIter()
+    assert [test.name for test in IterTest.select(
+        orderBy='name', batchSize=2)] == list(names)
+    select = IterTest.select(orderBy='name').batchSize(2)
+    assert select.ops['batchSize'] == 2
+    iteration = select.lazyIter()
+    assert iteration.next().name == 'a'
+    # The batch is built at once
+    assert [test.name for test in iteration._batch] == ['a', 'b']
+    assert [test.name for test in iteration] == ['b', 'c']
+
+def test_02c_stream():
+    setupIter()
+    select = IterTest.select(orderBy='name')
+    assert [test.name for test in select.stream(batchSize=2)] == list(names)
+    stream = select.stream()
+    assert stream.next().name == 'a'
+    stream.close()
+    assert stream.cursor is None
+    py.test.raises(StopIteration, stream.next)
+
 def test_03_ranged_indexed():
     all = IterTest.select()
     count = 0
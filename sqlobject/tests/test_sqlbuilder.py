@@ -69,3 +69,39 @@ def test_str_or_sqlrepr():
     delete = Delete('employees', where=None)
     assert sqlrepr(delete, 'sqlite') == \
         "DELETE FROM employees"
+
+def test_memoised_fragments():
+    setupClass(TestSQLBuilder)
+    clause = AND(TestSQLBuilder.q.value > 1, TestSQLBuilder.q.name == 'a')
+    assert sqlrepr(clause, 'sqlite') == sqlrepr(clause, 'sqlite') == \
+        "(((test_sql_builder.value) > (1)) AND " \
+        "((test_sql_builder.name) = ('a')))"
+    assert clause.tablesUsedSet('sqlite') == set(['test_sql_builder'])
+    # The caller may change the set it gets
+    clause.tablesUsedSet('sqlite').add('other')
+    assert clause.tablesUsedSet('sqlite') == set(['test_sql_builder'])
+    assert sqlrepr(TestSQLBuilder.q.value % 2, 'sqlite') == \
+        "((test_sql_builder.value) % (2))"
+    assert sqlrepr(TestSQLBuilder.q.value % 2, 'mysql') == \
+        "MOD(test_sql_builder.value, 2)"
+
+def test_memoised_lists():
+    setupClass(TestSQLBuilder)
+    values = [1, 2]
+    clause = IN(TestSQLBuilder.q.value, values)
+    assert sqlrepr(clause, 'sqlite') == \
+        "((test_sql_builder.value) IN (1, 2))"
+    values.append(3)
+    assert sqlrepr(clause, 'sqlite') == \
+        "((test_sql_builder.value) IN (1, 2, 3))"
+
+def test_chained_filters():
+    setupClass(TestSQLBuilder)
+    for value in range(5):
+        TestSQLBuilder(name=str(value), value=value)
+    results = TestSQLBuilder.select(orderBy='value')
+    for value in range(3):
+        results = results.filter(TestSQLBuilder.q.value != value)
+        assert [row.value for row in results] == range(value + 1, 5)
+    assert results.count() == 2
+    assert [row.value for row in results[1:2]] == [4]
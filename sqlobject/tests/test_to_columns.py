@@ -0,0 +1,64 @@
+from array import array
+from decimal import Decimal
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+########################################
+## Columns of select results as arrays
+########################################
+
+class ColumnsItem(SQLObject):
+    name = StringCol(length=50)
+    qty = IntCol(default=None)
+    price = FloatCol(default=None)
+    cost = DecimalCol(size=10, precision=2, default=None)
+    sold = BoolCol(default=False)
+
+def setupColumns():
+    setupClass(ColumnsItem)
+    ColumnsItem(name='a', qty=2, price=1.5, cost=Decimal('1.25'), sold=True)
+    ColumnsItem(name='b', qty=3, price=2.5, cost=Decimal('2.50'))
+    ColumnsItem(name='c')
+
+def test_to_columns_array():
+    setupColumns()
+    results = ColumnsItem.select(ColumnsItem.q.qty != None, orderBy='name')
+    qty, price, cost, sold, ids = results.toColumns(
+        ['qty', 'price', 'cost', 'sold', 'id'], format='array')
+    assert qty == array('l', [2, 3])
+    assert price == array('d', [1.5, 2.5])
+    assert cost == array('d', [1.25, 2.5])
+    assert sold == array('b', [1, 0])
+    assert ids == array('l', [item.id for item in results])
+    # Several batches
+    qty, = results.batchSize(1).toColumns(['qty'], format='array')
+    assert qty == array('l', [2, 3])
+
+def test_to_columns_nulls():
+    setupColumns()
+    results = ColumnsItem.select(orderBy='name')
+    price, = results.toColumns(['price'], format='array')
+    assert price[:2] == array('d', [1.5, 2.5])
+    assert price[2] != price[2] # NaN
+    raises(ValueError, results.toColumns, ['qty'], format='array')
+    raises(TypeError, results.toColumns, ['name'], format='array')
+    raises(ValueError, results.toColumns, ['qty'], format='list')
+    raises(AttributeError, results.toColumns, ['height'], format='array')
+
+def test_to_columns_numpy():
+    setupColumns()
+    results = ColumnsItem.select(ColumnsItem.q.qty != None, orderBy='name')
+    qty, sold = results.toColumns(['qty', 'sold'])
+    if numpy is None:
+        assert qty == array('l', [2, 3])
+        return
+    assert qty.tolist() == [2, 3]
+    assert sold.dtype == numpy.bool_
+    assert sold.tolist() == [True, False]
+    names, = results.toColumns(['name'])
+    assert names.dtype == object
+    assert names.tolist() == ['a', 'b']
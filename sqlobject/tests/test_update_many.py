@@ -0,0 +1,54 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+########################################
+## updateMany
+########################################
+
+class UpdateManyPerson(SQLObject):
+    name = StringCol(length=50, alternateID=True)
+    age = IntCol(default=None)
+
+def test_update_many():
+    setupClass(UpdateManyPerson)
+    UpdateManyPerson.createMany([dict(name=name, age=i)
+                                 for i, name in enumerate('abcde')])
+    a = UpdateManyPerson.byName('a')
+    e = UpdateManyPerson.byName('e')
+    UpdateManyPerson.updateMany(UpdateManyPerson.q.age < 2, age=10)
+    assert a.age == 10
+    assert e.age == 4
+    UpdateManyPerson.updateMany(UpdateManyPerson.q.name == 'e',
+                                age=UpdateManyPerson.q.age + 1)
+    assert e.age == 5
+    raises(TypeError, UpdateManyPerson.updateMany, age=1)
+    raises(TypeError, UpdateManyPerson.updateMany, None, height=1)
+    UpdateManyPerson.select(UpdateManyPerson.q.age == 10).update(age=11)
+    assert [p.name for p in UpdateManyPerson.selectBy(age=11)] == ['a', 'b']
+    UpdateManyPerson.select(orderBy='name')[3:5].update(age=None)
+    assert [p.age for p in UpdateManyPerson.select(orderBy='name')] == \
+        [11, 11, 2, None, None]
+    raises(SQLObjectNotFound, UpdateManyPerson.byName, 'f')
+    UpdateManyPerson.updateMany(UpdateManyPerson.q.name == 'e', name='f')
+    assert UpdateManyPerson.byName('f') is e
+
+def test_update_many_transaction():
+    setupClass(UpdateManyPerson)
+    UpdateManyPerson.createMany([dict(name=name, age=i)
+                                 for i, name in enumerate('abc')])
+    conn = UpdateManyPerson._connection
+    if not conn.supportTransactions:
+        return
+    conn.cache.clear()
+    a = UpdateManyPerson.byName('a')
+    c = UpdateManyPerson.byName('c')
+    assert a.age == 0
+    trans = conn.transaction()
+    UpdateManyPerson.updateMany(UpdateManyPerson.q.name == 'a', age=10,
+                                connection=trans)
+    UpdateManyPerson.select(orderBy='name', connection=trans)[2:3].update(
+        age=12)
+    trans.commit(close=True)
+    # The commit expires the rows in the cache of the connection
+    assert a.age == 10
+    assert c.age == 12
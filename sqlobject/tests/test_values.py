@@ -0,0 +1,87 @@
+import datetime
+from sqlobject import *
+from sqlobject.inheritance import InheritableSQLObject
+from sqlobject.tests.dbtest import *
+
+########################################
+## Plain values of select results
+########################################
+
+class ValuesRegion(SQLObject):
+    name = StringCol(length=50)
+
+class ValuesCustomer(SQLObject):
+    name = StringCol(length=50)
+    active = BoolCol(default=True)
+    since = DateCol(default=None)
+    region = ForeignKey('ValuesRegion', default=None)
+
+def setupValues():
+    setupClass([ValuesRegion, ValuesCustomer])
+    region = ValuesRegion(name='north')
+    ValuesCustomer(name='a', region=region,
+                   since=datetime.date(2000, 1, 2))
+    ValuesCustomer(name='b', active=False)
+    ValuesCustomer(name='c', region=region)
+    conn = ValuesCustomer._connection
+    conn.cache.clear()
+    return conn, region
+
+def test_tuples():
+    conn, region = setupValues()
+    results = ValuesCustomer.select(orderBy='name')
+    rows = list(results.tuples('name', 'active', 'since', 'region'))
+    assert rows == [('a', True, datetime.date(2000, 1, 2), region.id),
+                    ('b', False, None, None),
+                    ('c', True, None, region.id)]
+    assert list(results.tuples('regionID'))[0] == (region.id,)
+    ids = [row[0] for row in results.tuples()]
+    assert list(results.tuples())[0] == \
+        (ids[0], 'a', True, datetime.date(2000, 1, 2), region.id)
+    # No instances were made
+    for id in ids:
+        assert conn.cache.tryGet(id, ValuesCustomer) is None
+
+def test_dicts():
+    conn, region = setupValues()
+    results = ValuesCustomer.select(ValuesCustomer.q.active == True,
+                                    orderBy='-name')
+    assert list(results.dicts('name', 'region')) == \
+        [{'name': 'c', 'region': region.id},
+         {'name': 'a', 'region': region.id}]
+    row = list(results.dicts())[0]
+    assert sorted(row) == ['active', 'id', 'name', 'regionID', 'since']
+
+def test_values():
+    setupValues()
+    results = ValuesCustomer.select(orderBy='name')
+    assert list(results.values('name')) == ['a', 'b', 'c']
+    assert list(results[1:3].values('name')) == ['b', 'c']
+    assert list(results.values('name', 'active'))[1] == ('b', False)
+    raises(AttributeError, results.values, 'height')
+
+def test_values_transaction():
+    conn, region = setupValues()
+    if not conn.supportTransactions:
+        return
+    trans = conn.transaction()
+    try:
+        results = ValuesCustomer.select(orderBy='name', connection=trans)
+        assert list(results.values('name')) == ['a', 'b', 'c']
+    finally:
+        trans.rollback()
+
+class ValuesPerson(InheritableSQLObject):
+    name = StringCol(length=50)
+
+class ValuesEmployee(ValuesPerson):
+    position = StringCol(length=50)
+
+def test_values_inheritance():
+    setupClass([ValuesPerson, ValuesEmployee])
+    ValuesPerson(name='a')
+    ValuesEmployee(name='b', position='boss')
+    assert list(ValuesPerson.select(orderBy='name').values('name')) == \
+        ['a', 'b']
+    # The select of a child class is run by its parent class
+    assert list(ValuesEmployee.select().values('name')) == ['b']